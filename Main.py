@@ -1,6 +1,5 @@
 import Sudoku as s
 import SudokuSolver as ss
-from sqlitedict import SqliteDict as sd
 
 
 puzzle = s.Sudoku()
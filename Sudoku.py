@@ -6,23 +6,34 @@ Created on Thu Nov 19 22:44:58 2020
 """
 import numpy as np
 import SudokuSolver as Ss
-import SudokuGUI
-from sqlitedict import SqliteDict
-from tkinter import Tk
-import os.path
+from SudokuBoard import format_number
+# The GUI (Tkinter) and the storage modules are imported by the methods that use them,
+# so headless code importing Sudoku loads neither
 
 
 class Sudoku:
     
-    def __init__(self, puzzle_number=1, user_name="User"):
+    def __init__(self, puzzle_number=1, user_name="User", session=None):
+        # User index and store connections, shared with other Sudoku objects when a session is given
+        self.owns_session = session is None
+        if session is None:
+            from SudokuSession import Session
+            session = Session()
+        self.session = session
         self.user = self.login_user(user_name)
+        # The user's store, kept open by the session
+        self.store = self.session.get_store(self.user + ".sqlite")
         self.game_over = False
         self.sudoku_id = puzzle_number
+        # Solution cache, opened on first use
+        self.cache = None
+        # Read-only puzzle archive used instead of the DB by change_sudoku, see open_archive
+        self.archive = None
         # Chosen sudoku's state
-        self.start_state = np.array(self.get_from_db(user_name + ".sqlite", "puzzles", puzzle_number))
+        self.start_state = np.array(self.store.get("puzzles", puzzle_number))
         self.state = np.copy(self.start_state)
         # Chosen sudoku's solution
-        self.solution = np.array(self.get_from_db(user_name + ".sqlite", "solutions", puzzle_number))
+        self.solution = np.array(self.store.get("solutions", puzzle_number))
         # self.run_ui()
             
     def __str__(self, sdk=()):
@@ -31,10 +42,12 @@ class Sudoku:
             sdk = self.state
         length = len(sdk)
         sudoku_size = int(length**0.5)
+        # Characters per number: one symbol up to 25x25, every digit above
+        width = len(format_number(length, length))
         string = ''
         # Horizontal separator
         line = ''
-        for i in range(length*3-sudoku_size+1):
+        for i in range(length*(width+2)-sudoku_size+1):
             line += '-'
         line += '\n'
         string += line
@@ -43,9 +56,9 @@ class Sudoku:
             string += '|'
             for c in range(length):
                 if sdk[r, c] == 0:
-                    string += ' '
+                    string += ' ' * width
                 else:
-                    string += str(sdk[r, c])
+                    string += format_number(int(sdk[r, c]), length).rjust(width)
                 if (c+1) % sudoku_size == 0:
                     string += '|'
                 else:
@@ -59,10 +72,18 @@ class Sudoku:
         # Choose another sudoku
         # Chosen sudoku
         self.sudoku_id = num
+        if self.archive is not None and num in self.archive:
+            # Chosen sudoku's state and solution, sliced straight out of the archive
+            self.state = np.array(self.archive.get(num))
+            solution = self.archive.get_solution(num)
+            if solution is None:
+                solution = self.store.get("solutions", self.sudoku_id)
+            self.solution = np.array(solution)
+            return
         # Chosen sudoku's state
-        self.state = np.array(self.get_from_db(self.user + ".sqlite", "puzzles", self.sudoku_id))
+        self.state = np.array(self.store.get("puzzles", self.sudoku_id))
         # Chosen sudoku's solution
-        self.solution = np.array(self.get_from_db(self.user + ".sqlite", "solutions", self.sudoku_id))
+        self.solution = np.array(self.store.get("solutions", self.sudoku_id))
         
     def check_solution(self) -> bool:
         # Check solution's correctness
@@ -70,13 +91,32 @@ class Sudoku:
             return True
         return False
 
-    def compute_solution(self) -> int:
-        # Computes solution to given sudoku
-        solver = Ss.SudokuSolver(self)
-        solution = solver.solve()
-        if not solution:
-            return -1
-        return self.save_to_db(self.user + ".sqlite", "solutions", solution)
+    def compute_solution(self, unique=False) -> int:
+        # Computes solution to given sudoku, -1 if there is none (or more than one, when unique is set)
+        if unique:
+            solver = Ss.SudokuSolver(self, engine="dlx")
+            if solver.count_solutions(2) != 1:
+                return -1
+            solution = solver.solution
+        else:
+            if self.cache is None:
+                from SudokuCache import SolutionCache
+                self.cache = SolutionCache(self.user + ".sqlite")
+            solution = self.cache.solve(self.state)
+            if solution is None:
+                return -1
+        return self.store.add("solutions", solution)
+
+    def close(self) -> None:
+        # Close the archive and solution cache, and the session if this object opened it
+        if self.archive is not None:
+            self.archive.close()
+            self.archive = None
+        if self.cache is not None:
+            self.cache.close()
+            self.cache = None
+        if self.owns_session:
+            self.session.close()
 
     def create_new_user(self, user_name: str) -> None:
         # Add new user to DB
@@ -93,52 +133,51 @@ class Sudoku:
     @staticmethod
     def get_from_db(db_name: str, table_name: str, sudoku_number: int) -> tuple:
         # Retrieve specified data from selected DB
-        with SqliteDict(db_name, tablename=table_name, autocommit=True) as db:
-            return db[table_name].get(sudoku_number, None)
+        from SudokuStore import PuzzleStore
+        with PuzzleStore(db_name) as store:
+            return store.get(table_name, sudoku_number)
 
     @staticmethod
-    def import_data(db_name: str, file_name: str, table_name: str) -> None:
-        # Imports data from file to SqliteDict DB
-        temp_dict = dict()
-        with open(file_name, "r") as f:
-            for line in f:
-                args = line.split(": ")
-                temp_dict.update({eval(args[0]): eval(args[1])})
-        with SqliteDict(db_name, tablename=table_name, autocommit=True) as db:
-            db[table_name] = temp_dict
+    def import_data(db_name: str, file_name: str, table_name: str, progress=None) -> dict:
+        # Imports data from file to DB in batches, see SudokuImport.import_file
+        import SudokuImport
+        return SudokuImport.import_file(db_name, file_name, table_name, progress=progress)
 
     def import_default_files(self, db: str) -> None:
         # Imports the base puzzles and solutions for the creation of a new user
-        self.import_data(db, "puzzles.txt", "puzzles")
-        self.import_data(db, "solutions.txt", "solutions")
+        self.import_data(db, "Puzzles.txt", "puzzles")
+        self.import_data(db, "Solutions.txt", "solutions")
 
     def login_user(self, user_name: str) -> str:
-        # Initialize user account with files from DB
-        path = "./Users.txt"
-        if os.path.isfile(path):
-            with open("Users.txt", "r") as f:
-                for line in f:
-                    if line == user_name:
-                        return user_name    # User exists
-        self.create_new_user(user_name)
-        with open("Users.txt", "a") as f:
-            f.write(user_name)
-        return user_name
+        # Initialize user account with files from DB, creating it if the session's user index lacks it
+        return self.session.login(user_name, self.create_new_user)
 
     def new_puzzle(self, board: np.array) -> None:
         # Get new puzzle
         self.start_state = board
         self.state = np.copy(self.start_state)
-        solved_flg = self.compute_solution()
+        # The solution and the puzzle are written in one transaction
+        with self.store.transaction():
+            solved_flg = self.compute_solution(unique=True)
+            if solved_flg != -1:
+                # Store the puzzle under the id of its solution, which was free in both tables
+                puzzle_number = self.store.add("puzzles", board, solved_flg)
         if solved_flg == -1:
-            print("WARNING: Could not compute solution to the puzzle! \n\t\tPlease check the board's validity.")
-            self.start_state = np.array(self.get_from_db(self.user + ".sqlite", "puzzles", self.sudoku_id))
+            print("WARNING: The puzzle does not have a unique solution! \n\t\tPlease check the board's validity.")
+            self.start_state = np.array(self.store.get("puzzles", self.sudoku_id))
             self.state = np.copy(self.start_state)
         else:
-            puzzle_number = self.save_to_db(self.user + ".sqlite", "puzzles", board)
+            self.solution = np.array(self.store.get("solutions", puzzle_number))
             self.reset_sudoku()
             self.sudoku_id = puzzle_number
 
+    def open_archive(self, file_name: str) -> None:
+        # Read puzzles from a SudokuArchive file in change_sudoku, falling back to the DB for ids it lacks
+        from SudokuArchive import PuzzleArchive
+        if self.archive is not None:
+            self.archive.close()
+        self.archive = PuzzleArchive(file_name)
+
     def reset_sudoku(self) -> None:
         # Reset game state
         self.state = np.copy(self.start_state)
@@ -146,15 +185,22 @@ class Sudoku:
 
     def run_ui(self):
         # Start the Sudoku UI
+        import SudokuGUI
+        from tkinter import Tk
         root = Tk()
         SudokuGUI.SudokuUI(root, self)
         root.mainloop()
 
     @staticmethod
-    def save_to_db(db_name: str, table_name: str, sudoku: tuple) -> int:
-        # Save given sudoku state to selected DB
-        with SqliteDict(db_name, tablename=table_name, autocommit=True) as db:
-            temp_dict = db[table_name]
-            temp_dict.update({len(db[table_name]) + 1: tuple(map(tuple, sudoku))})
-            db[table_name] = temp_dict
-        return len(db[table_name]) + 1
+    def save_many_to_db(db_name: str, table_name: str, sudokus: list, ids=None, replace=False) -> list:
+        # Save several sudoku states to selected DB in a single transaction, returns their ids
+        from SudokuStore import PuzzleStore
+        with PuzzleStore(db_name) as store:
+            return store.add_many(table_name, sudokus, ids, replace)
+
+    @staticmethod
+    def save_to_db(db_name: str, table_name: str, sudoku: tuple, sudoku_number=None, replace=False) -> int:
+        # Save given sudoku state to selected DB (under the given id, or the next free one), returns its id
+        from SudokuStore import PuzzleStore
+        with PuzzleStore(db_name) as store:
+            return store.add(table_name, sudoku, sudoku_number, replace)
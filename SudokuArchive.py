@@ -0,0 +1,252 @@
+# -*- coding: utf-8 -*-
+"""
+Read-only binary puzzle archives with constant-time access through mmap.
+
+Layout, all integers little-endian:
+
+    header   magic b"SDKA", version (u16), side length (u8), flags (u8), record count (u32),
+             first id (u32), board size in bytes (u32)
+    records  one per puzzle, in increasing id order: the puzzle, then its solution if the
+             archive has solutions
+    index    the id of every record (u32 each), only when the ids are not consecutive
+
+Boards are packed two cells per byte (high nibble first) up to 9x9 and one byte per cell for
+larger boards. Without an index, puzzle id i is record i - first id; with one, the record is
+found by binary search over the mapped index, so opening an archive reads nothing but the header.
+"""
+import mmap
+import os
+import struct
+import sys
+from array import array
+from bisect import bisect_left
+from itertools import chain
+from math import isqrt
+
+import SudokuImport
+
+
+MAGIC = b"SDKA"
+VERSION = 1
+HEADER = struct.Struct("<4sHBBIII")
+HAS_SOLUTIONS = 1
+HAS_INDEX = 2
+# High and low nibble of every byte value
+HIGH_NIBBLES = bytes(value >> 4 for value in range(256))
+LOW_NIBBLES = bytes(value & 15 for value in range(256))
+
+
+def board_size(side_length: int) -> int:
+    # Bytes taken by a packed board
+    cells = side_length * side_length
+    return (cells + 1) // 2 if side_length < 16 else cells
+
+
+def export_text(archive_name: str, puzzle_file: str, solution_file=None) -> int:
+    # Write the puzzles (and solutions) of an archive as "id: ((...), ...)" lines, returns the number written
+    with PuzzleArchive(archive_name) as archive:
+        with open(puzzle_file, "w") as f:
+            for puzzle_id in archive.ids():
+                f.write("%d: %s\n" % (puzzle_id, archive.get(puzzle_id)))
+        if solution_file is not None and archive.has_solutions:
+            with open(solution_file, "w") as f:
+                for puzzle_id in archive.ids():
+                    f.write("%d: %s\n" % (puzzle_id, archive.get_solution(puzzle_id)))
+        return len(archive)
+
+
+def export_store(archive_name: str, db_name: str) -> int:
+    # Copy the puzzles (and solutions) of an archive to the user's store, returns the number copied
+    from SudokuStore import PuzzleStore
+    with PuzzleArchive(archive_name) as archive, PuzzleStore(db_name) as store:
+        batch = []
+        for puzzle_id in archive.ids():
+            batch.append(puzzle_id)
+            if len(batch) == SudokuImport.BATCH_SIZE:
+                archive.copy_to_store(store, batch)
+                batch = []
+        archive.copy_to_store(store, batch)
+        return len(archive)
+
+
+def import_store(archive_name: str, db_name: str, solutions=True) -> int:
+    # Write every puzzle of the user's store (with its solution, unless solutions is False) to an archive,
+    # streaming both from one query. A puzzle without a stored solution raises ValueError.
+    from SudokuStore import PuzzleStore
+    with PuzzleStore(db_name) as store:
+        return write_records(archive_name, store.iter_puzzles(solutions), solutions)
+
+
+def import_text(archive_name: str, puzzle_file: str, solution_file=None) -> int:
+    # Write the puzzles of a text file, in increasing id order, (and the solutions of another, matched by id)
+    # to an archive. Puzzles are streamed, solutions are held packed in memory.
+    solutions = None
+    if solution_file is not None:
+        solutions = {puzzle_id: pack_board(board) for puzzle_id, board in SudokuImport.read_puzzles(solution_file)}
+    return write_archive(archive_name, SudokuImport.read_puzzles(puzzle_file, validate=True), solutions)
+
+
+def pack_board(board) -> bytes:
+    # Pack a board (rows of numbers), two cells per byte up to 9x9
+    cells = bytes(chain.from_iterable(board))
+    side_length = isqrt(len(cells))
+    if side_length >= 16:
+        return cells
+    if len(cells) % 2:
+        cells += b"\0"
+    high, low = int.from_bytes(cells[0::2], "big"), int.from_bytes(cells[1::2], "big")
+    # Every cell is below 16, so shifting the whole number moves each one into its own byte's high nibble
+    return ((high << 4) | low).to_bytes(len(cells) // 2, "big")
+
+
+def unpack_board(data: bytes, side_length: int) -> tuple:
+    # Rows of numbers of a packed board
+    if side_length < 16:
+        cells = bytearray(2 * len(data))
+        cells[0::2] = data.translate(HIGH_NIBBLES)
+        cells[1::2] = data.translate(LOW_NIBBLES)
+    else:
+        cells = data
+    return tuple(tuple(cells[r * side_length:(r + 1) * side_length]) for r in range(side_length))
+
+
+def write_archive(archive_name: str, puzzles, solutions=None) -> int:
+    """
+    Write (id, board) pairs, in increasing id order, to an archive and return the number written.
+
+    solutions maps ids to solved boards (or to boards already packed by pack_board); when given,
+    every puzzle must have one. See write_records.
+    """
+    if solutions is None:
+        return write_records(archive_name, ((puzzle_id, board, None) for puzzle_id, board in puzzles), False)
+    return write_records(archive_name, ((puzzle_id, board, solutions.get(puzzle_id)) for puzzle_id, board in puzzles),
+                         True)
+
+
+def write_records(archive_name: str, records, has_solutions: bool) -> int:
+    """
+    Write (id, board, solution) records, in increasing id order, to an archive and return the number written.
+
+    Solutions are solved boards or boards already packed by pack_board, and are ignored unless has_solutions
+    is set, in which case a record without one raises ValueError. The archive is written to a temporary
+    file and renamed at the end; the temporary file is removed if writing fails.
+    """
+    temporary_name = archive_name + ".tmp"
+    ids = []
+    side_length = None
+    try:
+        with open(temporary_name, "wb") as f:
+            f.write(bytes(HEADER.size))
+            for puzzle_id, board, solution in records:
+                if side_length is None:
+                    side_length = len(board)
+                elif len(board) != side_length:
+                    raise ValueError("Puzzle %d is not %dx%d" % (puzzle_id, side_length, side_length))
+                if ids and puzzle_id <= ids[-1]:
+                    raise ValueError("Puzzle ids must be increasing, %d follows %d" % (puzzle_id, ids[-1]))
+                ids.append(puzzle_id)
+                f.write(pack_board(board))
+                if has_solutions:
+                    if solution is None:
+                        raise ValueError("Puzzle %d has no solution" % puzzle_id)
+                    f.write(solution if isinstance(solution, bytes) else pack_board(solution))
+            flags = HAS_SOLUTIONS if has_solutions else 0
+            if ids and ids[-1] - ids[0] != len(ids) - 1:
+                flags |= HAS_INDEX
+                index = array("I", ids)
+                if sys.byteorder == "big":
+                    index.byteswap()
+                f.write(index.tobytes())
+            f.seek(0)
+            f.write(HEADER.pack(MAGIC, VERSION, side_length or 0, flags, len(ids), ids[0] if ids else 0,
+                                board_size(side_length or 0)))
+        os.replace(temporary_name, archive_name)
+    except BaseException:
+        if os.path.exists(temporary_name):
+            os.remove(temporary_name)
+        raise
+    return len(ids)
+
+
+class PuzzleArchive:
+
+    def __init__(self, file_name: str):
+        # Map an archive file and read its header
+        self.file_name = file_name
+        with open(file_name, "rb") as f:
+            self.data = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        magic, version, self.side_length, flags, self.count, self.first_id, self.board_size = \
+            HEADER.unpack_from(self.data)
+        if magic != MAGIC or version != VERSION:
+            self.data.close()
+            raise ValueError("%s is not a version %d puzzle archive" % (file_name, VERSION))
+        self.has_solutions = bool(flags & HAS_SOLUTIONS)
+        self.record_size = self.board_size * (2 if self.has_solutions else 1)
+        self.index = None
+        if flags & HAS_INDEX:
+            offset = HEADER.size + self.count * self.record_size
+            self.index = memoryview(self.data)[offset:offset + 4 * self.count].cast("I")
+            if sys.byteorder == "big":
+                # The mapped index is little-endian, big-endian machines read a swapped copy
+                swapped = array("I", self.index)
+                swapped.byteswap()
+                self.index.release()
+                self.index = memoryview(swapped)
+
+    def __contains__(self, puzzle_id):
+        try:
+            self.get_record(puzzle_id)
+        except KeyError:
+            return False
+        return True
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
+
+    def __len__(self):
+        return self.count
+
+    def close(self) -> None:
+        if self.index is not None:
+            self.index.release()
+            self.index = None
+        self.data.close()
+
+    def copy_to_store(self, store, ids: list) -> None:
+        # Add the given puzzles (and their solutions) to a store in one batch
+        store.add_many("puzzles", [self.get(puzzle_id) for puzzle_id in ids], ids, replace=True)
+        if self.has_solutions:
+            store.add_many("solutions", [self.get_solution(puzzle_id) for puzzle_id in ids], ids, replace=True)
+
+    def get(self, puzzle_id: int) -> tuple:
+        # Puzzle with the given id, raises KeyError if there is none
+        offset = HEADER.size + self.get_record(puzzle_id) * self.record_size
+        return unpack_board(self.data[offset:offset + self.board_size], self.side_length)
+
+    def get_record(self, puzzle_id: int) -> int:
+        # Record number of a puzzle id, raises KeyError if there is none
+        if self.index is None:
+            record = puzzle_id - self.first_id
+            if 0 <= record < self.count:
+                return record
+        else:
+            record = bisect_left(self.index, puzzle_id)
+            if record < self.count and self.index[record] == puzzle_id:
+                return record
+        raise KeyError(puzzle_id)
+
+    def get_solution(self, puzzle_id: int):
+        # Solution of the puzzle with the given id, None if the archive has no solutions
+        if not self.has_solutions:
+            return None
+        offset = HEADER.size + self.get_record(puzzle_id) * self.record_size + self.board_size
+        return unpack_board(self.data[offset:offset + self.board_size], self.side_length)
+
+    def ids(self):
+        # Puzzle ids in increasing order
+        if self.index is None:
+            return range(self.first_id, self.first_id + self.count)
+        return self.index.tolist()
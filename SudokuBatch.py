@@ -0,0 +1,76 @@
+# -*- coding: utf-8 -*-
+"""
+Batch solving of large puzzle collections on a process pool.
+
+Boards are solved by SudokuSolver directly on compact SudokuBoard.Board objects, without
+creating Sudoku objects, so no user is logged in and no sqlite database is opened.
+"""
+import sys
+import time
+from itertools import islice
+from multiprocessing import Pool, cpu_count
+
+import SudokuSolver as Ss
+from SudokuBoard import Board
+from SudokuImport import read_puzzles
+
+
+def solve_one(item: tuple) -> tuple:
+    # Solve a single (id, board) pair and return (id, solution, stats)
+    puzzle_id, board = item
+    start = time.perf_counter()
+    solution = Ss.SudokuSolver(Board.from_rows(board)).solve()
+    stats = {"time": time.perf_counter() - start, "solved": len(solution) != 0}
+    if len(solution) == 0:
+        return puzzle_id, None, stats
+    return puzzle_id, tuple(solution), stats
+
+
+def map_windowed(func, items, workers=None, chunk_size=64, ordered=True):
+    """
+    Yield func(item) for an iterable of items, computed on a process pool.
+
+    workers is the number of processes (defaults to the CPU count, 1 maps in this process),
+    chunk_size the number of items sent to a worker at a time. The pool is fed a bounded window
+    of items at a time, so huge inputs are never fully buffered. With ordered=False results are
+    yielded as they complete.
+    """
+    workers = workers or cpu_count()
+    if workers == 1:
+        yield from map(func, items)
+        return
+    items = iter(items)
+    window = chunk_size * workers * 8
+    with Pool(workers) as pool:
+        pool_map = pool.imap if ordered else pool.imap_unordered
+        while True:
+            batch = list(islice(items, window))
+            if not batch:
+                break
+            yield from pool_map(func, batch, chunksize=chunk_size)
+
+
+def solve_batch(puzzles, workers=None, chunk_size=64, ordered=True):
+    """
+    Solve an iterable of (id, board) pairs and yield (id, solution, stats) for each one.
+
+    workers, chunk_size and ordered are those of map_windowed. Unsolvable boards yield a None solution.
+    """
+    return map_windowed(solve_one, puzzles, workers, chunk_size, ordered)
+
+
+def solve_file(file_name: str, workers=None, chunk_size=64, ordered=True):
+    # Solve every puzzle of the given file, see solve_batch
+    return solve_batch(read_puzzles(file_name), workers, chunk_size, ordered)
+
+
+if __name__ == "__main__":
+    # Usage: python SudokuBatch.py <puzzle file> [workers] [chunk size]
+    arguments = sys.argv[1:]
+    if not arguments:
+        print("Usage: python SudokuBatch.py <puzzle file> [workers] [chunk size]")
+        sys.exit(1)
+    pool_size = int(arguments[1]) if len(arguments) > 1 else None
+    chunk = int(arguments[2]) if len(arguments) > 2 else 64
+    for result in solve_file(arguments[0], pool_size, chunk):
+        print("%s: %s" % (result[0], result[1]))
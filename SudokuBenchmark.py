@@ -0,0 +1,200 @@
+# -*- coding: utf-8 -*-
+"""
+Benchmark of every solver engine over tiered puzzle corpora.
+
+Corpora are the default Puzzles.txt, generated easy and hard puzzles (fixed seeds), and the
+bundled 17-clue and pathological puzzles in Benchmarks/. Every solution is checked against the
+expected one. Results are printed as a table and can be written as JSON to compare commits:
+
+    python SudokuBenchmark.py --output before.json
+    python SudokuBenchmark.py --compare before.json after.json
+
+Start-up cost is measured separately, from python -X importtime in fresh interpreters:
+
+    python SudokuBenchmark.py --import-time
+"""
+import argparse
+import json
+import os.path
+import subprocess
+import sys
+import time
+import tracemalloc
+from types import SimpleNamespace
+
+import numpy as np
+import SudokuImport
+import SudokuSolver as Ss
+import SudokuVectorized
+from SudokuGenerator import SudokuGenerator
+
+
+BASE_PATH = os.path.dirname(os.path.abspath(__file__))
+# Solver engines and the SudokuSolver arguments selecting them
+ENGINES = {
+    "propagation": {"engine": "propagation"},
+    "sweep": {"propagation": "sweep"},
+    "legacy-sets": {"subsets": "legacy"},
+    "trail": {"backtracking": "trail"},
+    "random": {"strategy": "random"},
+    "dlx": {"engine": "dlx"},
+}
+# Corpora read from (puzzle file, solution file) pairs
+FILE_CORPORA = {
+    "default": ("Puzzles.txt", "Solutions.txt"),
+    "17-clue": ("Benchmarks/Puzzles17Clue.txt", "Benchmarks/Solutions17Clue.txt"),
+    "pathological": ("Benchmarks/PuzzlesPathological.txt", "Benchmarks/SolutionsPathological.txt"),
+}
+# Corpora generated locally, as (difficulty, seed)
+GENERATED_CORPORA = {
+    "easy": ("easy", 11),
+    "hard": ("expert", 12),
+}
+# Modules whose import time is measured, and the heavy dependencies reported when they get loaded
+IMPORT_MODULES = ("SudokuBoard", "SudokuSolver", "SudokuBatch", "Sudoku", "SudokuGUI")
+HEAVY_MODULES = ("numpy", "tkinter", "sqlite3", "sqlitedict")
+
+
+def compare_runs(old_file: str, new_file: str) -> None:
+    # Print the change of throughput and latency between two JSON results
+    with open(old_file) as f:
+        old = {(r["engine"], r["corpus"]): r for r in json.load(f)["results"]}
+    with open(new_file) as f:
+        new = {(r["engine"], r["corpus"]): r for r in json.load(f)["results"]}
+    print("%-12s %-13s %12s %12s %12s" % ("engine", "corpus", "throughput", "p50", "p99"))
+    for key in sorted(old.keys() & new.keys()):
+        ratios = ["%11.2fx" % (new[key][metric] / old[key][metric])
+                  if old[key][metric] and new[key][metric] else "%12s" % "-"
+                  for metric in ("throughput", "p50", "p99")]
+        print("%-12s %-13s %s" % (key[0], key[1], " ".join(ratios)))
+
+
+def get_commit() -> str:
+    # Current git commit, if any
+    try:
+        return subprocess.run(["git", "rev-parse", "HEAD"], cwd=BASE_PATH, capture_output=True,
+                              text=True).stdout.strip() or None
+    except OSError:
+        return None
+
+
+def load_corpora(size: int) -> dict:
+    # {name: [(puzzle, expected solution), ...]} for every corpus
+    corpora = {}
+    for name, (puzzle_file, solution_file) in FILE_CORPORA.items():
+        solutions = dict(SudokuImport.read_puzzles(os.path.join(BASE_PATH, solution_file)))
+        corpora[name] = [(board, solutions[puzzle_id])
+                         for puzzle_id, board in SudokuImport.read_puzzles(os.path.join(BASE_PATH, puzzle_file))]
+    for name, (difficulty, seed) in GENERATED_CORPORA.items():
+        corpora[name] = SudokuGenerator(seed=seed).generate_many(size, difficulty)
+    return corpora
+
+
+def measure_import_time(module: str, repeat=5) -> dict:
+    # Best cumulative import time (in microseconds) of a module in a fresh interpreter, and the heavy modules it loads
+    best, loaded = None, []
+    for _ in range(repeat):
+        output = subprocess.run([sys.executable, "-X", "importtime", "-c", "import " + module], cwd=BASE_PATH,
+                                capture_output=True, text=True).stderr
+        # Lines look like "import time:       self |  cumulative | name", nested names are indented
+        rows = [line.split("|") for line in output.splitlines() if line.startswith("import time:") and "|" in line]
+        names = {row[2].strip(): int(row[1]) for row in rows[1:]}
+        if module in names and (best is None or names[module] < best):
+            best = names[module]
+        loaded = [name for name in HEAVY_MODULES if name in names]
+    return {"module": module, "microseconds": best, "loads": loaded}
+
+
+def percentile(values: list, fraction: float) -> float:
+    # Nearest-rank percentile of a list of values
+    values = sorted(values)
+    return values[min(len(values) - 1, int(fraction * len(values)))]
+
+
+def run_engine(engine: str, corpus: list) -> dict:
+    # Solve every puzzle of a corpus with one engine and collect timing, search and memory figures
+    latencies, guesses, backtracks, failures = [], 0, 0, 0
+    start = time.perf_counter()
+    for board, expected in corpus:
+        solve_start = time.perf_counter()
+        solver = Ss.SudokuSolver(SimpleNamespace(state=np.array(board)), **ENGINES[engine])
+        solution = solver.solve()
+        latencies.append(time.perf_counter() - solve_start)
+        guesses += solver.stats.guesses
+        backtracks += solver.stats.reverts
+        if len(solution) == 0 or not np.array_equal(solution, expected):
+            failures += 1
+    elapsed = time.perf_counter() - start
+    # Peak memory is measured in a separate pass, tracing would distort the timings
+    tracemalloc.start()
+    for board, _ in corpus:
+        Ss.SudokuSolver(SimpleNamespace(state=np.array(board)), **ENGINES[engine]).solve()
+    peak_memory = tracemalloc.get_traced_memory()[1]
+    tracemalloc.stop()
+    return {"engine": engine, "puzzles": len(corpus), "failures": failures, "throughput": len(corpus) / elapsed,
+            "p50": percentile(latencies, 0.5), "p99": percentile(latencies, 0.99), "max": max(latencies),
+            "guesses": guesses, "backtracks": backtracks, "peak_memory": peak_memory}
+
+
+def run_vectorized(corpus: list) -> dict:
+    # Solve a corpus as one stack with the vectorized propagation engine (no per-puzzle latency)
+    boards = np.array([board for board, _ in corpus])
+    start = time.perf_counter()
+    solutions, solved = SudokuVectorized.solve_many(boards)
+    elapsed = time.perf_counter() - start
+    failures = sum(1 for solution, (_, expected) in zip(solutions, corpus) if not np.array_equal(solution, expected))
+    tracemalloc.start()
+    SudokuVectorized.solve_many(boards)
+    peak_memory = tracemalloc.get_traced_memory()[1]
+    tracemalloc.stop()
+    return {"engine": "vectorized", "puzzles": len(corpus), "failures": failures, "throughput": len(corpus) / elapsed,
+            "p50": None, "p99": None, "max": None, "guesses": None, "backtracks": None, "peak_memory": peak_memory}
+
+
+def run_benchmark(engines=tuple(ENGINES) + ("vectorized",), size=50) -> dict:
+    # Run every engine over every corpus
+    results = []
+    for corpus_name, corpus in load_corpora(size).items():
+        for engine in engines:
+            result = run_vectorized(corpus) if engine == "vectorized" else run_engine(engine, corpus)
+            result["corpus"] = corpus_name
+            results.append(result)
+    return {"commit": get_commit(), "time": time.time(), "results": results}
+
+
+def print_results(run: dict) -> None:
+    # Human-readable table of a benchmark run
+    print("%-12s %-13s %7s %6s %10s %10s %10s %10s %9s %9s %10s" % (
+        "engine", "corpus", "puzzles", "failed", "puzzles/s", "p50 ms", "p99 ms", "max ms", "guesses",
+        "reverts", "peak KiB"))
+    for r in run["results"]:
+        times = ["%10.3f" % (r[key] * 1000) if r[key] is not None else "%10s" % "-" for key in ("p50", "p99", "max")]
+        counts = ["%9d" % r[key] if r[key] is not None else "%9s" % "-" for key in ("guesses", "backtracks")]
+        print("%-12s %-13s %7d %6d %10.1f %s %s %10.1f" % (r["engine"], r["corpus"], r["puzzles"], r["failures"],
+                                                          r["throughput"], " ".join(times), " ".join(counts),
+                                                          r["peak_memory"] / 1024))
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Benchmark the sudoku solver engines.")
+    parser.add_argument("--engines", nargs="+", default=list(ENGINES) + ["vectorized"])
+    parser.add_argument("--size", type=int, default=50, help="puzzles per generated corpus")
+    parser.add_argument("--output", help="write the results as JSON to this file")
+    parser.add_argument("--compare", nargs=2, metavar=("OLD", "NEW"), help="compare two JSON result files")
+    parser.add_argument("--import-time", action="store_true", help="measure module import times instead")
+    arguments = parser.parse_args()
+    if arguments.compare:
+        compare_runs(*arguments.compare)
+    elif arguments.import_time:
+        print("%-14s %12s  %s" % ("module", "import ms", "heavy modules loaded"))
+        for module_name in IMPORT_MODULES:
+            timing = measure_import_time(module_name)
+            milliseconds = "%12.1f" % (timing["microseconds"] / 1000) if timing["microseconds"] is not None \
+                else "%12s" % "failed"
+            print("%-14s %s  %s" % (module_name, milliseconds, ", ".join(timing["loads"]) or "-"))
+    else:
+        benchmark = run_benchmark(arguments.engines, arguments.size)
+        print_results(benchmark)
+        if arguments.output:
+            with open(arguments.output, "w") as output:
+                json.dump(benchmark, output, indent=2)
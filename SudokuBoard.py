@@ -0,0 +1,135 @@
+# -*- coding: utf-8 -*-
+"""
+Compact board type for bulk workloads.
+
+A Board holds its cells in one bytearray, one byte per cell in row-major order (the layout the
+puzzle store uses), and has no per-instance __dict__. It reads and writes the common one line
+format with one character per cell, '0' or '.' for empty cells. SudokuSolver takes a Board
+directly: board.state is the board itself, indexed as board[row, column] like a NumPy state.
+
+Boards up to 25x25 have one character per number in that format: 1 to 9, then A to P (in either
+case) for 10 to 25, so a 16x16 board is written with 1-9 and A-G. Other alphabets, such as the
+hexadecimal 0-F used for 16x16 boards, are passed as symbols; '.' (and '0' if it is no symbol)
+then marks empty cells.
+"""
+from functools import lru_cache
+from math import isqrt
+
+
+EMPTY_CHARACTERS = ".0"
+# Characters of the numbers 1 to 25 in the one character per cell format
+SYMBOLS = "123456789ABCDEFGHIJKLMNOP"
+HEX_SYMBOLS = "0123456789ABCDEF"
+
+
+@lru_cache(maxsize=None)
+def cell_values(symbols=SYMBOLS) -> dict:
+    # Number of every character of an alphabet, 0 for the empty cell characters
+    values = {char: 0 for char in EMPTY_CHARACTERS if char not in symbols}
+    for number, char in enumerate(symbols, 1):
+        values[char.upper()] = values[char.lower()] = number
+    return values
+
+
+def format_cells(cells, symbols=SYMBOLS) -> str:
+    # One character per cell, '.' for empty cells
+    try:
+        return "".join(symbols[number - 1] if number else "." for number in cells)
+    except IndexError:
+        raise ValueError("Numbers above %d have no one character format" % len(symbols)) from None
+
+
+def format_number(number: int, side_length: int) -> str:
+    # A number as printed on a board of the given side: its symbol up to 25x25, its digits above
+    if side_length <= len(SYMBOLS):
+        return SYMBOLS[number - 1]
+    return str(number)
+
+
+def parse_cells(line: str, symbols=SYMBOLS) -> bytes:
+    # Cells of a line with one character per cell
+    values = cell_values(symbols)
+    try:
+        return bytes(values[char] for char in line)
+    except KeyError as error:
+        raise ValueError("Unknown cell character %r" % error.args[0]) from None
+
+
+class Board:
+
+    __slots__ = ("side_length", "cells")
+
+    def __init__(self, cells, side_length=None):
+        # Board over a bytes-like object of side_length ** 2 cells (copied into a bytearray)
+        self.cells = bytearray(cells)
+        self.side_length = side_length or isqrt(len(self.cells))
+        if self.side_length ** 2 != len(self.cells):
+            raise ValueError("%d cells do not make a square board" % len(self.cells))
+
+    def __bytes__(self):
+        return bytes(self.cells)
+
+    def __eq__(self, other):
+        if isinstance(other, Board):
+            return self.cells == other.cells
+        return NotImplemented
+
+    def __getitem__(self, index):
+        # board[row, column] is a cell, board[row] a tuple with the row's numbers
+        if isinstance(index, tuple):
+            return self.cells[index[0] * self.side_length + index[1]]
+        return tuple(self.cells[index * self.side_length:(index + 1) * self.side_length])
+
+    def __iter__(self):
+        for row in range(self.side_length):
+            yield self[row]
+
+    def __len__(self):
+        return self.side_length
+
+    def __repr__(self):
+        if self.side_length > len(SYMBOLS):
+            return "Board(%r)" % bytes(self.cells)
+        return "Board.parse(%r)" % str(self)
+
+    def __setitem__(self, index: tuple, number: int) -> None:
+        self.cells[index[0] * self.side_length + index[1]] = number
+
+    def __str__(self):
+        # One character per cell, '.' for empty cells
+        return format_cells(self.cells)
+
+    def copy(self):
+        return Board(self.cells, self.side_length)
+
+    def count_givens(self) -> int:
+        # Number of filled cells
+        return len(self.cells) - self.cells.count(0)
+
+    @classmethod
+    def from_rows(cls, rows):
+        # Board from rows of numbers, e.g. a tuple of tuples or a NumPy array
+        return cls(bytes(int(number) for row in rows for number in row), len(rows))
+
+    @classmethod
+    def parse(cls, line: str, symbols=SYMBOLS):
+        # Board from a line with one character per cell, '0' or '.' for empty cells
+        line = line.strip()
+        try:
+            return cls(parse_cells(line, symbols))
+        except ValueError:
+            raise ValueError("Not a board: %r" % line) from None
+
+    @property
+    def state(self):
+        # The board itself, so a Board can be handed to SudokuSolver in place of a Sudoku
+        return self
+
+    @state.setter
+    def state(self, board) -> None:
+        # Take over the cells of another board, e.g. a copy saved before a guess
+        self.cells = board.cells
+
+    def tolist(self) -> list:
+        # Rows as lists of numbers
+        return [list(row) for row in self]
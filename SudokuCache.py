@@ -0,0 +1,179 @@
+# -*- coding: utf-8 -*-
+"""
+Solution cache keyed by a canonical form of the board.
+
+Relabeling numbers, permuting rows inside a band, columns inside a stack, bands, stacks, and
+transposing turn a puzzle into an equivalent one. The canonical form is the smallest board,
+read row-major with numbers relabeled by first appearance, among the transforms that sort lines,
+bands and stacks by clue-count invariants. Those invariants do not depend on the transform
+applied, so equivalent puzzles get the same candidates and the same canonical form. Boards
+with too many tied candidates (very symmetric clue patterns) are not cached.
+"""
+import sqlite3
+from collections import OrderedDict
+from itertools import groupby, permutations, product
+from math import factorial, isqrt, prod
+
+import SudokuSolver as Ss
+from SudokuBoard import Board
+from SudokuStore import decode_board, encode_board
+
+
+MAX_CANDIDATES = 2048
+
+
+def get_canonical_form(board, max_candidates=MAX_CANDIDATES):
+    """
+    Canonical key of a board and the transform that produces it, or None if the board has too many candidates.
+
+    The transform is (transposed, rows, columns, labels): canonical[i][j] = labels[source[rows[i]][columns[j]]],
+    where source is the board, or its transpose when transposed is set.
+    """
+    grid = [[int(number) for number in row] for row in board]
+    box_length = isqrt(len(grid))
+    sources = (grid, [list(column) for column in zip(*grid)])
+    row_orders = [get_line_orders(source, box_length, max_candidates) for source in sources]
+    if None in row_orders:
+        return None
+    # The columns of a board are the rows of its transpose
+    line_orders = ((row_orders[0], row_orders[1]), (row_orders[1], row_orders[0]))
+    if sum(len(rows) * len(columns) for rows, columns in line_orders) > max_candidates:
+        return None
+    best = None
+    for transposed, (rows_list, columns_list) in enumerate(line_orders):
+        source = sources[transposed]
+        for rows in rows_list:
+            lines = [source[r] for r in rows]
+            for columns in columns_list:
+                labels = {0: 0}
+                for line in lines:
+                    for c in columns:
+                        if line[c] not in labels:
+                            labels[line[c]] = len(labels)
+                key = bytes(labels[line[c]] for line in lines for c in columns)
+                if best is None or key < best[0]:
+                    best = (key, (bool(transposed), rows, columns, labels))
+    return best
+
+
+def get_line_orders(grid: list, box_length: int, max_candidates: int):
+    # Every row order that sorts bands, and rows inside each band, by their clue counts per stack.
+    # None if there are more than max_candidates of them.
+    def row_key(r):
+        return tuple(sorted(sum(1 for c in range(s * box_length, (s + 1) * box_length) if grid[r][c])
+                            for s in range(box_length)))
+
+    def band_key(band):
+        return tuple(sorted(row_key(r) for r in range(band * box_length, (band + 1) * box_length)))
+
+    band_orders = get_tied_orders(range(box_length), band_key, max_candidates)
+    row_orders = [get_tied_orders(range(band * box_length, (band + 1) * box_length), row_key, max_candidates)
+                  for band in range(box_length)]
+    if band_orders is None or None in row_orders or \
+            len(band_orders) * prod(len(orders) for orders in row_orders) > max_candidates:
+        return None
+    return [[r for band_rows in rows for r in band_rows]
+            for bands in band_orders for rows in product(*(row_orders[band] for band in bands))]
+
+
+def get_tied_orders(items, key, max_candidates: int):
+    # Every order of items sorted by key, permuting items whose keys are tied. None if there are too many.
+    groups = [list(group) for _, group in groupby(sorted(items, key=key), key)]
+    if prod(factorial(len(group)) for group in groups) > max_candidates:
+        return None
+    return [[item for group in order for item in group]
+            for order in product(*(permutations(group) for group in groups))]
+
+
+def restore_board(canonical: tuple, transform: tuple) -> tuple:
+    # Map a board in canonical form back through the inverse of transform
+    transposed, rows, columns, labels = transform
+    side_length = len(canonical)
+    numbers = {label: number for number, label in labels.items()}
+    # Numbers absent from the puzzle take the remaining labels in increasing order
+    missing = [number for number in range(1, side_length + 1) if number not in labels]
+    for label in range(len(labels), side_length + 1):
+        numbers[label] = missing[label - len(labels)]
+    source = [[0] * side_length for _ in range(side_length)]
+    for i, r in enumerate(rows):
+        for j, c in enumerate(columns):
+            source[r][c] = numbers[canonical[i][j]]
+    if transposed:
+        source = [list(column) for column in zip(*source)]
+    return tuple(map(tuple, source))
+
+
+class SolutionCache:
+
+    def __init__(self, db_name=None, capacity=10000, engine="dlx"):
+        # In-memory LRU of up to capacity solutions, backed by "<db_name>.cache.sqlite" next to the user DB if given
+        self.capacity = capacity
+        self.engine = engine
+        self.memory = OrderedDict()
+        self.hits = 0
+        self.disk_hits = 0
+        self.misses = 0
+        self.uncached = 0
+        self.connection = None
+        if db_name is not None:
+            self.connection = sqlite3.connect(db_name.rsplit(".sqlite", 1)[0] + ".cache.sqlite")
+            with self.connection:
+                self.connection.execute("CREATE TABLE IF NOT EXISTS solutions (board BLOB PRIMARY KEY, solution BLOB)")
+
+    def close(self) -> None:
+        if self.connection is not None:
+            self.connection.close()
+
+    def get_stats(self) -> dict:
+        # Hit and miss counters
+        return {"hits": self.hits, "disk_hits": self.disk_hits, "misses": self.misses, "uncached": self.uncached,
+                "size": len(self.memory)}
+
+    def lookup(self, key: bytes):
+        # Canonical solution for a canonical key from memory, then disk; None on a miss
+        if key in self.memory:
+            self.memory.move_to_end(key)
+            self.hits += 1
+            return self.memory[key]
+        if self.connection is not None:
+            row = self.connection.execute("SELECT solution FROM solutions WHERE board = ?", (key,)).fetchone()
+            if row:
+                self.disk_hits += 1
+                self.remember(key, row[0])
+                return row[0]
+        return None
+
+    def remember(self, key: bytes, solution: bytes) -> None:
+        # Add a canonical solution to the LRU, evicting the least recently used one
+        self.memory[key] = solution
+        self.memory.move_to_end(key)
+        if len(self.memory) > self.capacity:
+            self.memory.popitem(last=False)
+
+    def solve(self, board):
+        # Solution of a board (tuple of rows), or None if it has none
+        canonical_form = get_canonical_form(board)
+        if canonical_form is None:
+            self.uncached += 1
+            return self.solve_board(board)
+        key, transform = canonical_form
+        solution = self.lookup(key)
+        if solution is None:
+            self.misses += 1
+            canonical_board = decode_board(key)
+            canonical_solution = self.solve_board(canonical_board)
+            solution = encode_board(canonical_solution) if canonical_solution else b""
+            self.remember(key, solution)
+            if self.connection is not None:
+                with self.connection:
+                    self.connection.execute("INSERT OR REPLACE INTO solutions VALUES (?, ?)", (key, solution))
+        if not solution:
+            return None
+        return restore_board(decode_board(solution), transform)
+
+    def solve_board(self, board):
+        # Solve a board with SudokuSolver, None if it has no solution
+        solution = Ss.SudokuSolver(Board.from_rows(board), engine=self.engine).solve()
+        if len(solution) == 0:
+            return None
+        return tuple(solution)
@@ -0,0 +1,254 @@
+# -*- coding: utf-8 -*-
+"""
+Exact cover solver for sudoku boards of any size, using Knuth's Dancing Links (Algorithm X).
+
+Every (row, column, number) placement is a matrix row covering four constraints: the cell is
+filled, and the number appears once in its row, its column and its box. Given cells are applied
+up front, so the matrix only holds the placements still open.
+"""
+
+
+class DancingLinks:
+
+    def __init__(self, board, excluded=()):
+        # Build the exact cover matrix for the given board (any object indexable as board[row, column]).
+        # Placements (row, column, number) in excluded are left out of the matrix.
+        self.side_length = len(board)
+        self.box_length = int(self.side_length ** 0.5)
+        self.board = [[int(board[r, c]) for c in range(self.side_length)] for r in range(self.side_length)]
+        # Placement (row, column, number) and first node of each matrix row, and the matrix row of each node
+        self.placements = []
+        self.row_nodes = []
+        self.node_rows = []
+        # Rows of the last solution found
+        self.solution_rows = []
+        # Rows tried and rows taken back by the search
+        self.guesses = 0
+        self.backtracks = 0
+        self.valid = True
+        self.excluded = set(excluded)
+        self.build_matrix()
+
+    def build_matrix(self) -> None:
+        # Create the column headers and one linked row per open placement
+        n = self.side_length
+        size = n * n
+        row_numbers, column_numbers, box_numbers = [0] * n, [0] * n, [0] * n
+        for r in range(n):
+            for c in range(n):
+                number = self.board[r][c]
+                if number:
+                    bit = 1 << (number - 1)
+                    box = (r // self.box_length) * self.box_length + c // self.box_length
+                    if (row_numbers[r] | column_numbers[c] | box_numbers[box]) & bit:
+                        # Repeated number in a row, column or box
+                        self.valid = False
+                    row_numbers[r] |= bit
+                    column_numbers[c] |= bit
+                    box_numbers[box] |= bit
+        # Constraints not yet satisfied by the givens become columns, node 0 is the root
+        constraints = {}
+        for r in range(n):
+            for c in range(n):
+                if not self.board[r][c]:
+                    constraints[r * n + c] = len(constraints) + 1
+        for unit, used in enumerate((row_numbers, column_numbers, box_numbers)):
+            for index in range(n):
+                for number in range(n):
+                    if not used[index] >> number & 1:
+                        constraints[(unit + 1) * size + index * n + number] = len(constraints) + 1
+        headers = len(constraints) + 1
+        self.left = [i - 1 for i in range(headers)]
+        self.right = [i + 1 for i in range(headers)]
+        self.left[0], self.right[-1] = headers - 1, 0
+        self.up = list(range(headers))
+        self.down = list(range(headers))
+        self.column = list(range(headers))
+        self.sizes = [0] * headers
+        self.node_rows = [-1] * headers
+        for r in range(n):
+            for c in range(n):
+                if self.board[r][c]:
+                    continue
+                box = (r // self.box_length) * self.box_length + c // self.box_length
+                free = ~(row_numbers[r] | column_numbers[c] | box_numbers[box])
+                for number in range(n):
+                    if free >> number & 1 and (r, c, number + 1) not in self.excluded:
+                        self.add_row((r, c, number + 1), (constraints[r * n + c],
+                                                          constraints[size + r * n + number],
+                                                          constraints[2 * size + c * n + number],
+                                                          constraints[3 * size + box * n + number]))
+
+    def add_row(self, placement: tuple, columns: tuple) -> None:
+        # Append a matrix row with one node in each of the given columns
+        row = len(self.placements)
+        self.placements.append(placement)
+        first = len(self.column)
+        self.row_nodes.append(first)
+        for offset, column in enumerate(columns):
+            node = first + offset
+            self.column.append(column)
+            self.node_rows.append(row)
+            self.left.append(node - 1 if offset else first + len(columns) - 1)
+            self.right.append(node + 1 if offset < len(columns) - 1 else first)
+            # Insert at the bottom of the column
+            self.up.append(self.up[column])
+            self.down.append(column)
+            self.down[self.up[column]] = node
+            self.up[column] = node
+            self.sizes[column] += 1
+
+    def count_solutions(self, limit=2) -> int:
+        # Count the solutions of the board, stopping as soon as limit is reached
+        if not self.valid:
+            return 0
+        return self.search(limit)
+
+    def cover(self, column: int) -> None:
+        # Remove a column and every row that has a node in it
+        left, right, up, down, col, sizes = self.left, self.right, self.up, self.down, self.column, self.sizes
+        right[left[column]] = right[column]
+        left[right[column]] = left[column]
+        i = down[column]
+        while i != column:
+            j = right[i]
+            while j != i:
+                down[up[j]] = down[j]
+                up[down[j]] = up[j]
+                sizes[col[j]] -= 1
+                j = right[j]
+            i = down[i]
+
+    def get_solution(self) -> list:
+        # Board of the last solution found, as a list of rows
+        board = [row.copy() for row in self.board]
+        for row in self.solution_rows:
+            r, c, number = self.placements[row]
+            board[r][c] = number
+        return board
+
+    def hide_row(self, row: int) -> None:
+        # Unlink a matrix row from its columns so the search never takes it, undone by unhide_row
+        up, down, col, sizes = self.up, self.down, self.column, self.sizes
+        node = j = self.row_nodes[row]
+        while True:
+            down[up[j]] = down[j]
+            up[down[j]] = up[j]
+            sizes[col[j]] -= 1
+            j = self.right[j]
+            if j == node:
+                break
+
+    def search(self, limit: int) -> int:
+        # Iterative Algorithm X, always branching on the column with the fewest rows
+        left, right, down, col, sizes = self.left, self.right, self.down, self.column, self.sizes
+        chosen = []
+        found = 0
+        forward = True
+        while True:
+            if forward:
+                if right[0] == 0:
+                    # Every constraint covered, a solution was found
+                    found += 1
+                    if found == 1:
+                        self.solution_rows = [self.node_rows[node] for node in chosen]
+                    if found >= limit:
+                        break
+                    forward = False
+                    continue
+                best = right[0]
+                c = right[best]
+                while c != 0 and sizes[best] > 1:
+                    if sizes[c] < sizes[best]:
+                        best = c
+                    c = right[c]
+                if sizes[best] == 0:
+                    # Constraint that can no longer be satisfied
+                    forward = False
+                    continue
+                self.cover(best)
+                node = down[best]
+            else:
+                if not chosen:
+                    break
+                node = chosen.pop()
+                self.backtracks += 1
+                j = left[node]
+                while j != node:
+                    self.uncover(col[j])
+                    j = left[j]
+                node = down[node]
+                if node == col[node]:
+                    # Every row of this column was tried
+                    self.uncover(node)
+                    continue
+                forward = True
+            chosen.append(node)
+            self.guesses += 1
+            j = right[node]
+            while j != node:
+                self.cover(col[j])
+                j = right[j]
+        # Uncover the rows still chosen when the limit was reached, leaving the matrix as it was built
+        while chosen:
+            node = chosen.pop()
+            j = left[node]
+            while j != node:
+                self.uncover(col[j])
+                j = left[j]
+            self.uncover(col[node])
+        return found
+
+    def select_row(self, row: int) -> None:
+        # Take a matrix row into the solution for good, as for a given: cover every column it has a node in.
+        # Selections are undone by unselect_row, most recent first.
+        node = j = self.row_nodes[row]
+        while True:
+            self.cover(self.column[j])
+            j = self.right[j]
+            if j == node:
+                break
+
+    def solve(self) -> list:
+        # Board of the first solution, or [] if there is none
+        if self.count_solutions(1) == 0:
+            return []
+        return self.get_solution()
+
+    def uncover(self, column: int) -> None:
+        # Restore a column removed by cover, in reverse order
+        left, right, up, down, col, sizes = self.left, self.right, self.up, self.down, self.column, self.sizes
+        i = up[column]
+        while i != column:
+            j = left[i]
+            while j != i:
+                sizes[col[j]] += 1
+                down[up[j]] = j
+                up[down[j]] = j
+                j = left[j]
+            i = up[i]
+        right[left[column]] = column
+        left[right[column]] = column
+
+    def unhide_row(self, row: int) -> None:
+        # Link a row unlinked by hide_row back into its columns
+        up, down, col, sizes = self.up, self.down, self.column, self.sizes
+        node = self.row_nodes[row]
+        j = self.left[node]
+        while True:
+            sizes[col[j]] += 1
+            down[up[j]] = j
+            up[down[j]] = j
+            if j == node:
+                break
+            j = self.left[j]
+
+    def unselect_row(self, row: int) -> None:
+        # Undo select_row, uncovering the row's columns in reverse order
+        node = self.row_nodes[row]
+        j = self.left[node]
+        while True:
+            self.uncover(self.column[j])
+            if j == node:
+                break
+            j = self.left[j]
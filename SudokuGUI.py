@@ -5,15 +5,19 @@ Created on Mon Apr 12 22:20:19 2021
 @author: joaom
 """
 
-from tkinter import Canvas, Frame, Button, BOTH, LEFT, RIGHT
+from tkinter import Canvas, Frame, Button, Label, BOTH, LEFT, RIGHT
+from SudokuBoard import cell_values, format_number
+from SudokuHints import ConflictTracker, HintWorker, describe_hint
 
 
 BOARDS = ['debug', 'n00b', 'l33t', 'error']  # Available sudoku boards
 MARGIN = 20  # Pixels around the board
-SIDE = 50  # Width of every board cell.
-WIDTH = HEIGHT = MARGIN * 2 + SIDE * 9  # Width and height of the whole board
+SIDE = 50  # Width of every board cell on a 9x9 board
+MIN_SIDE = 30  # Smallest cell width, for larger boards
+BOARD_SIZE = SIDE * 9  # Width and height of the cells of the board, unless cells would get smaller than MIN_SIDE
 BUTTON_WIDTH = 50
 BUTTON_HEIGHT = 40
+HINT_POLL_MS = 50  # Milliseconds between checks for a finished hint
 
 class SudokuError(Exception):
     """
@@ -31,57 +35,77 @@ class SudokuUI(Frame):
         self.parent = parent
         Frame.__init__(self, parent)
         self.row, self.col = 0, 0
+        # Board dimensions in cells and pixels, from the game's board
+        self.side_length = len(game.start_state)
+        self.box_length = int(self.side_length ** 0.5)
+        self.side = max(MIN_SIDE, BOARD_SIZE // self.side_length)
+        self.width = self.height = MARGIN * 2 + self.side * self.side_length
+        self.font = ("Bold", self.side * 2 // 5)
+        self.marks_font = ("Courier", max(6, self.side // (2 * self.box_length)))
+        # One text item per cell for its answer and one for its pencil marks, created once and updated in place
+        self.cell_items = []
+        self.mark_items = []
+        self.conflicts = ConflictTracker(game.state)
+        # Pencil marks and hints are computed on a worker thread and picked up by __poll_hints
+        self.hints = HintWorker()
+        self.hint = None
+        self.candidates = {}
+        self.show_marks = False
+        self.show_hint = False
 
         self.__init_ui()
 
     # Set up UI
     def __init_ui(self):
         self.parent.title("Sudoku")
-        self.parent.geometry("%dx%d" % (WIDTH + 3.5 * BUTTON_WIDTH, HEIGHT))
+        buttons_height = (self.box_length + 5) * BUTTON_HEIGHT
+        self.parent.geometry("%dx%d" % (self.width + (self.box_length + 0.5) * BUTTON_WIDTH,
+                                        max(self.height, buttons_height)))
         self.pack(fill=BOTH, expand=1)
-        self.canvas = Canvas(self, width=WIDTH, height=HEIGHT)
+        self.canvas = Canvas(self, width=self.width, height=self.height)
         self.canvas.pack(side=LEFT)
-        self.buttons_frame = Frame(self, width=4 * BUTTON_WIDTH, height=4 * BUTTON_HEIGHT)
+        self.buttons_frame = Frame(self, width=self.box_length * BUTTON_WIDTH, height=buttons_height)
         self.buttons_frame.pack(side=RIGHT)
-        one_button = Button(self.buttons_frame, text="1", font=("Bold", 20), command=lambda: self.__insert_number(1))
-        one_button.place(x=0, y=0, width=BUTTON_WIDTH, height=BUTTON_HEIGHT)
-        two_button = Button(self.buttons_frame, text="2", font=("Bold", 20), command=lambda: self.__insert_number(2))
-        two_button.place(x=BUTTON_WIDTH, y=0, width=BUTTON_WIDTH, height=BUTTON_HEIGHT)
-        three_button = Button(self.buttons_frame, text="3", font=("Bold", 20), command=lambda: self.__insert_number(3))
-        three_button.place(x=2 * BUTTON_WIDTH, y=0, width=BUTTON_WIDTH, height=BUTTON_HEIGHT)
-        four_button = Button(self.buttons_frame, text="4", font=("Bold", 20), command=lambda: self.__insert_number(4))
-        four_button.place(x=0, y=BUTTON_HEIGHT, width=BUTTON_WIDTH, height=BUTTON_HEIGHT)
-        five_button = Button(self.buttons_frame, text="5", font=("Bold", 20), command=lambda: self.__insert_number(5))
-        five_button.place(x=BUTTON_WIDTH, y=BUTTON_HEIGHT, width=BUTTON_WIDTH, height=BUTTON_HEIGHT)
-        six_button = Button(self.buttons_frame, text="6", font=("Bold", 20), command=lambda: self.__insert_number(6))
-        six_button.place(x=2 * BUTTON_WIDTH, y=BUTTON_HEIGHT, width=BUTTON_WIDTH, height=BUTTON_HEIGHT)
-        seven_button = Button(self.buttons_frame, text="7", font=("Bold", 20), command=lambda: self.__insert_number(7))
-        seven_button.place(x=0, y=2 * BUTTON_HEIGHT, width=BUTTON_WIDTH, height=BUTTON_HEIGHT)
-        eight_button = Button(self.buttons_frame, text="8", font=("Bold", 20), command=lambda: self.__insert_number(8))
-        eight_button.place(x=BUTTON_WIDTH, y=2 * BUTTON_HEIGHT, width=BUTTON_WIDTH, height=BUTTON_HEIGHT)
-        nine_button = Button(self.buttons_frame, text="9", font=("Bold", 20), command=lambda: self.__insert_number(9))
-        nine_button.place(x=2 * BUTTON_WIDTH, y=2 * BUTTON_HEIGHT, width=BUTTON_WIDTH, height=BUTTON_HEIGHT)
+        # One button per number, box_length buttons per line
+        for number in range(1, self.side_length + 1):
+            button = Button(self.buttons_frame, text=format_number(number, self.side_length), font=("Bold", 20),
+                            command=lambda number=number: self.__insert_number(number))
+            button.place(x=((number - 1) % self.box_length) * BUTTON_WIDTH,
+                         y=((number - 1) // self.box_length) * BUTTON_HEIGHT, width=BUTTON_WIDTH, height=BUTTON_HEIGHT)
+        half_width = self.box_length / 2 * BUTTON_WIDTH
         delete_button = Button(self.buttons_frame, text="Del", font=("Bold", 20), command=lambda: self.__insert_number(0))
-        delete_button.place(x=0, y=3 * BUTTON_HEIGHT, width=1.5 * BUTTON_WIDTH, height=BUTTON_HEIGHT)
+        delete_button.place(x=0, y=self.box_length * BUTTON_HEIGHT, width=half_width, height=BUTTON_HEIGHT)
         clear_button = Button(self.buttons_frame, text="Clear", font=("Bold", 20), command=self.__clear_answers)
-        clear_button.place(x=1.5 * BUTTON_WIDTH, y=3 * BUTTON_HEIGHT, width=1.5 * BUTTON_WIDTH, height=BUTTON_HEIGHT)
+        clear_button.place(x=half_width, y=self.box_length * BUTTON_HEIGHT, width=half_width, height=BUTTON_HEIGHT)
+        marks_button = Button(self.buttons_frame, text="Notes", font=("Bold", 20), command=self.__toggle_marks)
+        marks_button.place(x=0, y=(self.box_length + 1) * BUTTON_HEIGHT, width=half_width, height=BUTTON_HEIGHT)
+        hint_button = Button(self.buttons_frame, text="Hint", font=("Bold", 20), command=self.__toggle_hint)
+        hint_button.place(x=half_width, y=(self.box_length + 1) * BUTTON_HEIGHT, width=half_width, height=BUTTON_HEIGHT)
+        self.hint_label = Label(self.buttons_frame, text="", justify=LEFT, anchor="nw",
+                                wraplength=self.box_length * BUTTON_WIDTH)
+        self.hint_label.place(x=0, y=(self.box_length + 2) * BUTTON_HEIGHT, width=self.box_length * BUTTON_WIDTH,
+                              height=3 * BUTTON_HEIGHT)
 
         self.__draw_grid()
+        self.__create_cells()
         self.__draw_puzzle()
 
         self.canvas.bind("<Button-1>", self.__cell_clicked)
         self.canvas.bind("<Key>", self.__key_pressed)
+        self.bind("<Destroy>", lambda event: self.hints.close())
+        self.__request_hints()
+        self.after(HINT_POLL_MS, self.__poll_hints)
 
     def __cell_clicked(self, event):
         if self.game.game_over:
             return
 
         x, y = event.x, event.y
-        if MARGIN < x < WIDTH - MARGIN and MARGIN < y < HEIGHT - MARGIN:
+        if MARGIN < x < self.width - MARGIN and MARGIN < y < self.height - MARGIN:
             self.canvas.focus_set()
 
             # Get row and col numbers from x,y coordinates
-            row, col = (y - MARGIN) // SIDE, (x - MARGIN) // SIDE
+            row, col = (y - MARGIN) // self.side, (x - MARGIN) // self.side
 
             # If cell was already selected, deselect it
             if (row, col) == (self.row, self.col):
@@ -95,76 +119,193 @@ class SudokuUI(Frame):
         self.game.reset_sudoku()
         self.canvas.delete("victory")
         self.canvas.delete("winner")
+        self.conflicts.reset(self.game.state)
         self.__draw_puzzle()
+        self.__request_hints()
+
+    def __create_cells(self):
+        """
+        Creates the (empty) answer and pencil mark text items of every cell.
+        """
+        for i in range(self.side_length):
+            row_items, row_marks = [], []
+            for j in range(self.side_length):
+                x = MARGIN + j * self.side + self.side / 2
+                y = MARGIN + i * self.side + self.side / 2
+                row_items.append(self.canvas.create_text(x, y, text="", tags="numbers", font=self.font))
+                row_marks.append(self.canvas.create_text(x, y, text="", tags="marks", fill="gray40",
+                                                         font=self.marks_font))
+            self.cell_items.append(row_items)
+            self.mark_items.append(row_marks)
+
+    def __draw_cell(self, i, j):
+        """
+        Updates the text item of a cell: givens in black, answers in gray, repeated answers in red.
+        """
+        answer = int(self.game.state[i][j])
+        if answer == 0:
+            self.canvas.itemconfigure(self.cell_items[i][j], text="")
+            self.__draw_marks(i, j)
+            return
+        if self.game.start_state[i][j] != 0:
+            color = "black"
+        elif self.conflicts.cell_conflicts(i, j, answer):
+            color = "red"
+        else:
+            color = "slate gray"
+        self.canvas.itemconfigure(self.cell_items[i][j], text=format_number(answer, self.side_length), fill=color)
+        self.canvas.itemconfigure(self.mark_items[i][j], text="")
 
     def __draw_cursor(self):
         self.canvas.delete("cursor")
         if self.row >= 0 and self.col >= 0:
-            x0 = MARGIN + self.col * SIDE + 1
-            y0 = MARGIN + self.row * SIDE + 1
-            x1 = MARGIN + (self.col + 1) * SIDE - 1
-            y1 = MARGIN + (self.row + 1) * SIDE - 1
+            x0 = MARGIN + self.col * self.side + 1
+            y0 = MARGIN + self.row * self.side + 1
+            x1 = MARGIN + (self.col + 1) * self.side - 1
+            y1 = MARGIN + (self.row + 1) * self.side - 1
             self.canvas.create_rectangle(x0, y0, x1, y1, outline="red", tags="cursor")
 
     def __draw_grid(self):
         """
-        Draws grid divided with blue lines into 3x3 squares
+        Draws grid divided with black lines into boxes
         """
-        for i in range(10):
-            color = "black" if i % 3 == 0 else "gray"
+        for i in range(self.side_length + 1):
+            color = "black" if i % self.box_length == 0 else "gray"
 
             # Draw vertical lines
-            x0 = MARGIN + i * SIDE
+            x0 = MARGIN + i * self.side
             y0 = MARGIN
-            x1 = MARGIN + i * SIDE
-            y1 = HEIGHT - MARGIN
+            x1 = MARGIN + i * self.side
+            y1 = self.height - MARGIN
             self.canvas.create_line(x0, y0, x1, y1, fill=color)
 
             # Draw horizontal lines
             x0 = MARGIN
-            y0 = MARGIN + i * SIDE
-            x1 = WIDTH - MARGIN
-            y1 = MARGIN + i * SIDE
+            y0 = MARGIN + i * self.side
+            x1 = self.width - MARGIN
+            y1 = MARGIN + i * self.side
             self.canvas.create_line(x0, y0, x1, y1, fill=color)
 
+    def __draw_hint(self):
+        """
+        Shows the latest hint, if asked for, as a green frame around its cell and a line of text.
+        """
+        self.canvas.delete("hint")
+        if not self.show_hint or self.hint is None:
+            self.hint_label.configure(text="Looking for a hint..." if self.show_hint else "")
+            return
+        self.hint_label.configure(text=describe_hint(self.hint))
+        if self.hint["cell"] is not None:
+            row, col = self.hint["cell"]
+            self.canvas.create_rectangle(MARGIN + col * self.side + 3, MARGIN + row * self.side + 3,
+                                         MARGIN + (col + 1) * self.side - 3, MARGIN + (row + 1) * self.side - 3,
+                                         outline="green", width=2, tags="hint")
+
+    def __draw_marks(self, i, j):
+        """
+        Updates the pencil marks of an empty cell, one line per box_length numbers.
+        """
+        options = self.candidates.get((i, j), 0) if self.show_marks else 0
+        if not options:
+            self.canvas.itemconfigure(self.mark_items[i][j], text="")
+            return
+        width = len(format_number(self.side_length, self.side_length))
+        numbers = [format_number(number, self.side_length).rjust(width) if options >> (number - 1) & 1
+                   else " " * width for number in range(1, self.side_length + 1)]
+        lines = [" ".join(numbers[k:k + self.box_length]) for k in range(0, self.side_length, self.box_length)]
+        self.canvas.itemconfigure(self.mark_items[i][j], text="\n".join(lines))
+
     def __draw_puzzle(self):
-        self.canvas.delete("numbers")
-        for i in range(9):
-            for j in range(9):
-                answer = self.game.state[i][j]
-                if answer != 0:
-                    x = MARGIN + j * SIDE + SIDE / 2
-                    y = MARGIN + i * SIDE + SIDE / 2
-                    original = self.game.start_state[i][j]
-                    color = "black" if answer == original else "slate gray"
-                    self.canvas.create_text(x, y, text=answer, tags="numbers", fill=color, font=("Bold", 20))
+        """
+        Updates every cell, after the whole board changed.
+        """
+        for i in range(self.side_length):
+            for j in range(self.side_length):
+                self.__draw_cell(i, j)
 
     def __draw_victory(self):
         # create a oval (which will be a circle)
-        x0 = y0 = MARGIN + SIDE * 2
-        x1 = y1 = MARGIN + SIDE * 7
-        self.canvas.create_oval(x0, y0, x1, y1, tags="victory", fill="dark orange", outline="orange")
+        center = MARGIN + self.side * self.side_length / 2
+        radius = self.side * self.side_length * 5 / 18
+        self.canvas.create_oval(center - radius, center - radius, center + radius, center + radius, tags="victory",
+                                fill="dark orange", outline="orange")
         # create text
-        x = y = MARGIN + 4 * SIDE + SIDE / 2
-        self.canvas.create_text(x, y, text="You win!", tags="winner", fill="white", font=("Arial", 32))
+        self.canvas.create_text(center, center, text="You win!", tags="winner", fill="white", font=("Arial", 32))
 
     def __insert_number(self, number):
         if self.game.game_over:
             return
         if self.row >= 0 and self.col >= 0 and self.game.start_state[self.row][self.col] == 0:
-            self.game.state[self.row][self.col] = number
-            self.__draw_puzzle()
-            self.__draw_cursor()
-            if self.game.check_solution():
-                self.__draw_victory()
+            self.__set_cell(self.row, self.col, number)
 
     def __key_pressed(self, event):
         if self.game.game_over:
             return
-        if self.row >= 0 and self.col >= 0 and event.char in "1234567890" and \
+        # Numbers are typed as their symbols, 1 to 9 then letters; 0 or . erases
+        number = cell_values().get(event.char)
+        if self.row >= 0 and self.col >= 0 and number is not None and number <= self.side_length and \
                 self.game.start_state[self.row][self.col] == 0:
-            self.game.state[self.row][self.col] = int(event.char)
-            self.__draw_puzzle()
-            self.__draw_cursor()
-            if self.game.check_solution():
-                self.__draw_victory()
+            self.__set_cell(self.row, self.col, number)
+
+    def __poll_hints(self):
+        """
+        Picks up a finished hint from the worker thread and redraws the pencil marks that changed.
+        """
+        hint = self.hints.poll()
+        if hint is not None:
+            candidates = hint["candidates"]
+            changed = {cell for cell in set(self.candidates) | set(candidates)
+                       if self.candidates.get(cell) != candidates.get(cell)}
+            self.candidates = candidates
+            self.hint = hint
+            if self.show_marks:
+                for i, j in changed:
+                    if int(self.game.state[i][j]) == 0:
+                        self.__draw_marks(i, j)
+            self.__draw_hint()
+        self.after(HINT_POLL_MS, self.__poll_hints)
+
+    def __request_hints(self):
+        """
+        Asks the worker for the hints of the current board; the hint shown so far is stale and is cleared,
+        and the next one is shown as soon as it is ready if hints are on.
+        """
+        self.hint = None
+        self.__draw_hint()
+        self.hints.submit(self.game.state)
+
+    def __set_cell(self, row, col, number):
+        """
+        Writes a number (0 to erase) to a cell and redraws only the cells whose state it changes.
+        """
+        old = int(self.game.state[row][col])
+        if old == number:
+            return
+        self.game.state[row][col] = number
+        self.conflicts.update(row, col, old, number)
+        # The cell itself and the answers of its units repeating the old or new number may change color
+        self.__draw_cell(row, col)
+        for unit in self.conflicts.geometry.cell_units[row, col]:
+            for i, j in self.conflicts.geometry.units[unit]:
+                if (i, j) != (row, col) and self.game.state[i][j] in (old, number) and self.game.state[i][j]:
+                    self.__draw_cell(i, j)
+        self.__draw_cursor()
+        self.__request_hints()
+        if self.conflicts.is_solved():
+            self.__draw_victory()
+
+    def __toggle_hint(self):
+        """
+        Shows or hides the next logical step, shown as soon as it is computed.
+        """
+        self.show_hint = not self.show_hint
+        self.__draw_hint()
+
+    def __toggle_marks(self):
+        """
+        Shows or hides the pencil marks of the empty cells.
+        """
+        self.show_marks = not self.show_marks
+        for i, j in self.candidates:
+            if int(self.game.state[i][j]) == 0:
+                self.__draw_marks(i, j)
@@ -0,0 +1,171 @@
+# -*- coding: utf-8 -*-
+"""
+Puzzle generator with unique solutions and a target difficulty.
+
+Difficulty is the SudokuGrader level of the puzzle, set by the hardest technique LogicalSolver needs:
+"easy" needs naked singles only, "medium" hidden singles, "hard" pointing, box-line reduction or
+naked and hidden subsets, and "expert" x-wings, swordfish or guessing.
+
+Clues are removed from a solved grid one at a time, in random order. Every generator keeps one
+Dancing Links matrix of the empty board, where the clues of a puzzle are selected rows: a removal
+unselects one clue, and the uniqueness check is a search with the removed placement hidden, which
+leaves the matrix as it found it. Difficulty only grows as clues go, so the longest run of removals
+within the target difficulty is found by bisection, grading a handful of boards per puzzle rather
+than one per removal. generate_many spreads the puzzles over a process pool, one seed per puzzle,
+so the output does not depend on the pool size.
+"""
+from random import Random
+
+import numpy as np
+from SudokuBatch import map_windowed
+from SudokuDLX import DancingLinks
+from SudokuGrader import DIFFICULTIES, LogicalSolver
+
+
+def generate_one(item: tuple) -> tuple:
+    # Generate a (puzzle, solution) pair from a (box_length, difficulty, seed) item, in a worker process
+    box_length, difficulty, seed = item
+    return SudokuGenerator(box_length, seed).generate(difficulty)
+
+
+class SudokuGenerator:
+
+    def __init__(self, box_length=3, seed=None):
+        # Initialize generator for boards of side box_length ** 2
+        self.box_length = box_length
+        self.side_length = box_length ** 2
+        self.random = Random(seed)
+        # Dancing Links matrix of the empty board and its row of each placement, built on first use
+        self.exact_cover = None
+        self.placement_rows = None
+
+    def full_grid(self) -> list:
+        # Random solved board: a shuffled first row completed by Dancing Links, then shuffled bands and stacks
+        first_row = list(range(1, self.side_length + 1))
+        self.random.shuffle(first_row)
+        exact_cover = self.get_exact_cover()
+        rows = [self.placement_rows[0, c, number] for c, number in enumerate(first_row)]
+        for row in rows:
+            exact_cover.select_row(row)
+        exact_cover.count_solutions(1)
+        for row in reversed(rows):
+            exact_cover.unselect_row(row)
+        grid = [first_row] + [[0] * self.side_length for _ in range(1, self.side_length)]
+        for row in exact_cover.solution_rows:
+            r, c, number = exact_cover.placements[row]
+            grid[r][c] = number
+        rows = self.shuffled_lines()
+        columns = self.shuffled_lines()
+        return [[grid[r][c] for c in columns] for r in rows]
+
+    def generate(self, difficulty="medium", max_attempts=100) -> tuple:
+        # Generate a (puzzle, solution) pair of the given difficulty
+        if difficulty not in DIFFICULTIES:
+            raise ValueError("Unknown difficulty: %r" % difficulty)
+        level = DIFFICULTIES.index(difficulty)
+        for _ in range(max_attempts):
+            solution = self.full_grid()
+            puzzle = self.remove_clues(solution, level)
+            if self.grade(puzzle) == difficulty:
+                return puzzle, solution
+        raise ValueError("Could not generate a %s puzzle in %d attempts" % (difficulty, max_attempts))
+
+    def generate_many(self, count: int, difficulty="medium", workers=None) -> list:
+        # Generate count (puzzle, solution) pairs of the given difficulty on a process pool, see map_windowed
+        items = [(self.box_length, difficulty, self.random.getrandbits(64)) for _ in range(count)]
+        return list(map_windowed(generate_one, items, workers, chunk_size=4))
+
+    def get_exact_cover(self) -> DancingLinks:
+        # Dancing Links matrix of the empty board, shared by every puzzle of this generator
+        if self.exact_cover is None:
+            self.exact_cover = DancingLinks(np.zeros((self.side_length, self.side_length), dtype=int))
+            self.placement_rows = {placement: row for row, placement in enumerate(self.exact_cover.placements)}
+        return self.exact_cover
+
+    @staticmethod
+    def grade(puzzle) -> str:
+        # Difficulty of a puzzle on the SudokuGrader scale, from the hardest technique LogicalSolver needs
+        return LogicalSolver(puzzle, log=False).grade()["level"]
+
+    def remove_clues(self, solution: list, level: int) -> list:
+        # Remove clues one at a time, keeping the solution unique and the difficulty at most level.
+        # Removing a clue keeps the solution unique exactly when no solution has another number there,
+        # so each step is a single Dancing Links search with that placement hidden.
+        exact_cover = self.get_exact_cover()
+        cells = [(r, c) for r in range(self.side_length) for c in range(self.side_length)]
+        self.random.shuffle(cells)
+        clue_rows = [self.placement_rows[r, c, solution[r][c]] for r, c in cells]
+        # Selections are undone most recent first, so the clue tried first is selected last
+        for row in reversed(clue_rows):
+            exact_cover.select_row(row)
+        # Rows of the clues kept so far, selected above the clues not tried yet
+        kept = []
+        removed = []
+        for cell, row in zip(cells, clue_rows):
+            for kept_row in reversed(kept):
+                exact_cover.unselect_row(kept_row)
+            exact_cover.unselect_row(row)
+            for kept_row in kept:
+                exact_cover.select_row(kept_row)
+            exact_cover.hide_row(row)
+            unique = exact_cover.count_solutions(1) == 0
+            exact_cover.unhide_row(row)
+            if unique:
+                removed.append(cell)
+            else:
+                exact_cover.select_row(row)
+                kept.append(row)
+        for kept_row in reversed(kept):
+            exact_cover.unselect_row(kept_row)
+
+        def puzzle_after(count: int) -> list:
+            # Board left by the first count removals
+            puzzle = [row.copy() for row in solution]
+            for r, c in removed[:count]:
+                puzzle[r][c] = 0
+            return puzzle
+
+        if level == len(DIFFICULTIES) - 1:
+            return puzzle_after(len(removed))
+        # Longest run of removals whose puzzle is at most level, the solved grid (no removal) being easy
+        low, high, low_level = 0, len(removed), 0
+        while low < high:
+            middle = (low + high + 1) // 2
+            middle_level = DIFFICULTIES.index(self.grade(puzzle_after(middle)))
+            if middle_level <= level:
+                low, low_level = middle, middle_level
+            else:
+                high = middle - 1
+        puzzle = puzzle_after(low)
+        # Below level, try the later removals one at a time, skipping those that go past it. More clues
+        # than when it was checked cannot make a removal's solution less unique.
+        for r, c in removed[low + 1:]:
+            if low_level == level:
+                break
+            puzzle[r][c], number = 0, puzzle[r][c]
+            removal_level = DIFFICULTIES.index(self.grade(puzzle))
+            if removal_level > level:
+                puzzle[r][c] = number
+            else:
+                low_level = removal_level
+        return puzzle
+
+    @staticmethod
+    def save_puzzles(db_name: str, puzzles: list) -> list:
+        # Write (puzzle, solution) pairs to the store in one transaction, returns the new puzzle ids
+        from SudokuStore import PuzzleStore
+        with PuzzleStore(db_name) as store, store.transaction():
+            ids = store.add_many("puzzles", [puzzle for puzzle, _ in puzzles])
+            store.add_many("solutions", [solution for _, solution in puzzles], ids)
+        return ids
+
+    def shuffled_lines(self) -> list:
+        # Random order of rows (or columns) that keeps every band (or stack) together
+        bands = list(range(self.box_length))
+        self.random.shuffle(bands)
+        lines = []
+        for band in bands:
+            offsets = list(range(self.box_length))
+            self.random.shuffle(offsets)
+            lines += [band * self.box_length + offset for offset in offsets]
+        return lines
@@ -0,0 +1,43 @@
+# -*- coding: utf-8 -*-
+"""
+Cell, unit and peer tables of a board size.
+
+The tables are computed once per side length and shared by every solver of that size. Cells are
+(row, column) tuples, the keys SudokuSolver uses. Units are numbered rows first (0 to n - 1),
+then columns (n to 2n - 1), then boxes (2n to 3n - 1), boxes left to right and top to bottom.
+"""
+from functools import lru_cache
+from math import isqrt
+
+
+class Geometry:
+
+    def __init__(self, side_length: int):
+        # Build the tables of a board of side_length (a perfect square)
+        box_length = isqrt(side_length)
+        if box_length * box_length != side_length:
+            raise ValueError("Side length %d is not a perfect square" % side_length)
+        self.side_length = side_length
+        self.box_length = box_length
+        self.cells = tuple((r, c) for r in range(side_length) for c in range(side_length))
+        # box_of[row][column] is the index of the box containing the cell
+        self.box_of = tuple(tuple((r // box_length) * box_length + c // box_length for c in range(side_length))
+                            for r in range(side_length))
+        self.rows = tuple(tuple((r, c) for c in range(side_length)) for r in range(side_length))
+        self.columns = tuple(tuple((r, c) for r in range(side_length)) for c in range(side_length))
+        self.boxes = tuple(tuple((b // box_length * box_length + i // box_length,
+                                  b % box_length * box_length + i % box_length) for i in range(side_length))
+                           for b in range(side_length))
+        self.units = self.rows + self.columns + self.boxes
+        # Indices in units of the row, column and box of each cell
+        self.cell_units = {(r, c): (r, side_length + c, 2 * side_length + self.box_of[r][c])
+                           for r, c in self.cells}
+        # Cells sharing a unit with each cell, the cell itself excluded
+        self.peers = {cell: tuple(sorted({peer for unit in self.cell_units[cell] for peer in self.units[unit]} - {cell}))
+                      for cell in self.cells}
+
+
+@lru_cache(maxsize=None)
+def get_geometry(side_length: int) -> Geometry:
+    # Shared tables of a board size
+    return Geometry(side_length)
@@ -0,0 +1,343 @@
+# -*- coding: utf-8 -*-
+"""
+Technique-ordered logical solver and difficulty grader.
+
+LogicalSolver solves the way a person would: it always applies the cheapest technique that makes
+progress, then starts again from the cheapest one. Techniques, from cheapest to hardest:
+
+    naked_single     a cell with one option left
+    hidden_single    a number with one place left in a row, column or box
+    pointing         a number confined to one line inside a box leaves the rest of the line
+    box_line         a number confined to one box inside a line leaves the rest of the box
+    naked_subset     k cells of a unit holding only k numbers (pairs to quads)
+    hidden_subset    k numbers of a unit fitting only k cells (pairs to quads)
+    x_wing           a number confined to the same 2 columns in 2 rows (or rows in columns)
+    swordfish        the same with 3 lines
+
+Every step is logged with its technique, and the time spent in each technique is measured, the
+failed attempts included. A puzzle's score is the sum of the weights of its steps, its level that
+of its hardest technique, the scale SudokuGenerator generates to. A puzzle logic cannot finish is "expert"
+and gets STALL_WEIGHT on top. Grading runs on candidate bitmasks (bit n - 1 for number n) and
+needs no search, so corpora of millions of puzzles are graded on a process pool:
+
+    python SudokuGrader.py Puzzles.txt [workers] [chunk size]
+"""
+import sys
+import time
+from functools import lru_cache
+
+from SudokuBatch import map_windowed
+from SudokuGeometry import get_geometry
+from SudokuImport import read_puzzles
+from SudokuSubsets import find_subsets, number_positions
+
+
+# Technique names, from cheapest to hardest, with the weight of a step and the level they set
+TECHNIQUES = ("naked_single", "hidden_single", "pointing", "box_line", "naked_subset", "hidden_subset", "x_wing",
+              "swordfish")
+WEIGHTS = {"naked_single": 1, "hidden_single": 2, "pointing": 5, "box_line": 6, "naked_subset": 8,
+           "hidden_subset": 10, "x_wing": 20, "swordfish": 30}
+LEVELS = {"naked_single": "easy", "hidden_single": "medium", "pointing": "hard", "box_line": "hard",
+          "naked_subset": "hard", "hidden_subset": "hard", "x_wing": "expert", "swordfish": "expert"}
+DIFFICULTIES = ("easy", "medium", "hard", "expert")
+STALL_WEIGHT = 100
+MAX_SUBSET_SIZE = 4
+
+
+@lru_cache(maxsize=None)
+def get_intersections(side_length: int) -> tuple:
+    # (segment, rest of the line, rest of the box) for every box and row or column crossing it
+    geometry = get_geometry(side_length)
+    intersections = []
+    for box in geometry.boxes:
+        box_cells = set(box)
+        for line in {geometry.rows[r] for r, _ in box} | {geometry.columns[c] for _, c in box}:
+            segment = tuple(cell for cell in line if cell in box_cells)
+            intersections.append((segment, tuple(cell for cell in line if cell not in box_cells),
+                                  tuple(cell for cell in box if cell not in segment)))
+    return tuple(sorted(intersections))
+
+
+class LogicalSolver:
+
+    def __init__(self, board, log=True):
+        # Candidates of a board (rows of numbers, 0 for empty cells); steps are only recorded if log is set
+        self.side_length = len(board)
+        self.geometry = get_geometry(self.side_length)
+        self.board = [list(map(int, row)) for row in board]
+        self.log = log
+        # (technique, cell, number, options eliminated) of every step, cell and number None when they do not apply
+        self.steps = []
+        self.counts = dict.fromkeys(TECHNIQUES, 0)
+        self.times = dict.fromkeys(TECHNIQUES, 0.0)
+        # Set when a cell or a number has no place left: the board has no solution
+        self.contradiction = False
+        self.cell_number_options = {}
+        # Empty cells in row-major order, as an ordered set
+        self.empty_cells = {}
+        numbers = (1 << self.side_length) - 1
+        used = [0] * len(self.geometry.units)
+        for r, row in enumerate(self.board):
+            for c, number in enumerate(row):
+                if number:
+                    bit = 1 << (number - 1)
+                    for unit in self.geometry.cell_units[r, c]:
+                        if used[unit] & bit:
+                            self.contradiction = True
+                        used[unit] |= bit
+        for cell in self.geometry.cells:
+            if self.board[cell[0]][cell[1]]:
+                self.cell_number_options[cell] = 0
+            else:
+                row, column, box = self.geometry.cell_units[cell]
+                self.cell_number_options[cell] = numbers & ~(used[row] | used[column] | used[box])
+                self.empty_cells[cell] = None
+
+    def box_line(self) -> bool:
+        # A number that fits a line only inside one box cannot go in the rest of that box
+        options = self.cell_number_options
+        for segment, line_rest, box_rest in get_intersections(self.side_length):
+            confined = 0
+            for cell in segment:
+                confined |= options[cell]
+            for cell in line_rest:
+                confined &= ~options[cell]
+            if confined and self.eliminate(box_rest, confined, "box_line"):
+                return True
+        return False
+
+    def eliminate(self, cells, numbers: int, technique: str, number=None) -> int:
+        # Remove numbers from the options of cells and log the step if any was removed, returns the count removed
+        options = self.cell_number_options
+        eliminated = 0
+        for cell in cells:
+            removed = options[cell] & numbers
+            if removed:
+                eliminated += removed.bit_count()
+                options[cell] &= ~numbers
+                if not options[cell]:
+                    self.contradiction = True
+        if eliminated:
+            self.record(technique, None, number, eliminated)
+        return eliminated
+
+    def fish(self, size: int, technique: str) -> bool:
+        # X-wing (size 2) and swordfish (size 3): a number confined to the same size columns in size rows
+        # cannot go elsewhere in those columns, and the same with rows and columns swapped
+        n = self.side_length
+        # Positions of each number in each row (bit c for column c) and in each column (bit r for row r)
+        in_rows = [[0] * n for _ in range(n)]
+        in_columns = [[0] * n for _ in range(n)]
+        for (r, c), mask in self.cell_number_options.items():
+            while mask:
+                bit = mask & -mask
+                number = bit.bit_length() - 1
+                in_rows[number][r] |= 1 << c
+                in_columns[number][c] |= 1 << r
+                mask ^= bit
+        for number in range(n):
+            for positions, crossing in ((in_rows[number], self.geometry.columns),
+                                        (in_columns[number], self.geometry.rows)):
+                for indices, union in find_subsets(positions, size):
+                    cells = [cell for i in range(n) if union >> i & 1
+                             for k, cell in enumerate(crossing[i]) if k not in indices]
+                    if self.eliminate(cells, 1 << number, technique, number + 1):
+                        return True
+        return False
+
+    def grade(self) -> dict:
+        # Solve as far as logic goes and grade the puzzle
+        self.solve()
+        solved = not self.empty_cells and not self.contradiction
+        hardest = max((TECHNIQUES.index(technique) for technique, count in self.counts.items() if count), default=0)
+        level = LEVELS[TECHNIQUES[hardest]] if solved else DIFFICULTIES[-1]
+        score = sum(WEIGHTS[technique] * count for technique, count in self.counts.items())
+        if not solved:
+            score += STALL_WEIGHT
+        return {"solved": solved, "contradiction": self.contradiction, "level": level, "score": score,
+                "counts": self.counts.copy(), "times": self.times.copy(), "steps": self.steps if self.log else None}
+
+    def hidden_single(self) -> bool:
+        # Place every number that fits only one cell of a unit
+        options = self.cell_number_options
+        placed = False
+        for unit in self.geometry.units:
+            # Numbers fitting at least one and at least two cells of the unit
+            once, twice = 0, 0
+            for cell in unit:
+                twice |= once & options[cell]
+                once |= options[cell]
+            unique = once & ~twice
+            if not unique:
+                continue
+            for cell in unit:
+                number_options = options[cell] & unique
+                if number_options:
+                    if number_options & (number_options - 1):
+                        # Two numbers can only go in this cell
+                        self.contradiction = True
+                        return placed
+                    self.place(cell, number_options.bit_length(), "hidden_single")
+                    placed = True
+        return placed
+
+    def hidden_subset(self) -> bool:
+        # k numbers that fit only the same k cells of a unit leave those cells no other option
+        options = self.cell_number_options
+        for unit in self.geometry.units:
+            masks = [options[cell] for cell in unit]
+            open_cells = sum(1 for mask in masks if mask)
+            positions = number_positions(masks, self.side_length)
+            for size in range(2, min(MAX_SUBSET_SIZE, open_cells // 2) + 1):
+                for numbers, union in find_subsets(positions, size):
+                    others = ~sum(1 << n for n in numbers)
+                    if self.eliminate([cell for i, cell in enumerate(unit) if union >> i & 1], others,
+                                      "hidden_subset"):
+                        return True
+        return False
+
+    def naked_single(self) -> bool:
+        # Place every cell with a single option left
+        options = self.cell_number_options
+        placed = False
+        for cell in list(self.empty_cells):
+            number_options = options[cell]
+            if not number_options:
+                self.contradiction = True
+                return placed
+            if not number_options & (number_options - 1):
+                self.place(cell, number_options.bit_length(), "naked_single")
+                placed = True
+        return placed
+
+    def naked_subset(self) -> bool:
+        # k cells of a unit whose options hold only k numbers leave those numbers to no other cell of the unit
+        options = self.cell_number_options
+        for unit in self.geometry.units:
+            masks = [options[cell] for cell in unit]
+            open_cells = sum(1 for mask in masks if mask)
+            for size in range(2, min(MAX_SUBSET_SIZE, open_cells // 2) + 1):
+                for indices, union in find_subsets(masks, size):
+                    if self.eliminate([cell for i, cell in enumerate(unit) if i not in indices], union,
+                                      "naked_subset"):
+                        return True
+        return False
+
+    def place(self, cell: tuple, number: int, technique: str) -> None:
+        # Fill a cell and remove its number from the options of its peers
+        self.board[cell[0]][cell[1]] = number
+        self.cell_number_options[cell] = 0
+        del self.empty_cells[cell]
+        bit = 1 << (number - 1)
+        options = self.cell_number_options
+        for peer in self.geometry.peers[cell]:
+            options[peer] &= ~bit
+        self.record(technique, cell, number, 0)
+
+    def pointing(self) -> bool:
+        # A number that fits a box only inside one line cannot go in the rest of that line
+        options = self.cell_number_options
+        for segment, line_rest, box_rest in get_intersections(self.side_length):
+            confined = 0
+            for cell in segment:
+                confined |= options[cell]
+            for cell in box_rest:
+                confined &= ~options[cell]
+            if confined and self.eliminate(line_rest, confined, "pointing"):
+                return True
+        return False
+
+    def record(self, technique: str, cell, number, eliminated: int) -> None:
+        # Count a step, and log it if steps are kept
+        self.counts[technique] += 1
+        if self.log:
+            self.steps.append((technique, cell, number, eliminated))
+
+    def solve(self) -> list:
+        # Apply the cheapest technique that makes progress until the board is full or none does,
+        # returns the board (filled as far as logic went)
+        techniques = [(technique, getattr(self, technique)) for technique in TECHNIQUES]
+        while self.empty_cells and not self.contradiction:
+            for technique, apply in techniques:
+                start = time.perf_counter()
+                progress = apply()
+                self.times[technique] += time.perf_counter() - start
+                if progress or self.contradiction:
+                    break
+            else:
+                # Logic is stuck, the puzzle needs guessing
+                break
+        return self.board
+
+    def swordfish(self) -> bool:
+        return self.fish(3, "swordfish")
+
+    def x_wing(self) -> bool:
+        return self.fish(2, "x_wing")
+
+
+def grade(board, log=True) -> dict:
+    """
+    Grade a board (rows of numbers, 0 for empty cells).
+
+    Returns {"solved", "contradiction", "level", "score", "counts", "times", "steps"}: counts and
+    times hold the steps and seconds of every technique, steps the (technique, cell, number,
+    eliminated) log, or None when log is not set.
+    """
+    return LogicalSolver(board, log).grade()
+
+
+def grade_batch(puzzles, workers=None, chunk_size=256, log=False):
+    # Grade an iterable of (id, board) pairs on a process pool and yield (id, grade) in order, see SudokuBatch
+    return map_windowed(grade_one, ((puzzle_id, board, log) for puzzle_id, board in puzzles), workers, chunk_size)
+
+
+def grade_file(file_name: str, workers=None, chunk_size=256, log=False):
+    # Grade every puzzle of the given file, see grade_batch
+    return grade_batch(read_puzzles(file_name), workers, chunk_size, log)
+
+
+def grade_one(item: tuple) -> tuple:
+    # Grade a single (id, board, log) item and return (id, grade)
+    puzzle_id, board, log = item
+    return puzzle_id, grade(board, log)
+
+
+def summarize(grades) -> dict:
+    # Totals over an iterable of (id, grade) pairs: puzzles per level, mean score, steps and seconds per technique
+    summary = {"puzzles": 0, "solved": 0, "contradictions": 0, "levels": dict.fromkeys(DIFFICULTIES, 0),
+               "mean_score": 0.0, "counts": dict.fromkeys(TECHNIQUES, 0), "times": dict.fromkeys(TECHNIQUES, 0.0)}
+    total_score = 0
+    for _, result in grades:
+        summary["puzzles"] += 1
+        summary["solved"] += result["solved"]
+        summary["contradictions"] += result["contradiction"]
+        summary["levels"][result["level"]] += 1
+        total_score += result["score"]
+        for technique in TECHNIQUES:
+            summary["counts"][technique] += result["counts"][technique]
+            summary["times"][technique] += result["times"][technique]
+    if summary["puzzles"]:
+        summary["mean_score"] = total_score / summary["puzzles"]
+    return summary
+
+
+if __name__ == "__main__":
+    # Usage: python SudokuGrader.py <puzzle file> [workers] [chunk size]
+    arguments = sys.argv[1:]
+    if not arguments:
+        print("Usage: python SudokuGrader.py <puzzle file> [workers] [chunk size]")
+        sys.exit(1)
+    pool_size = int(arguments[1]) if len(arguments) > 1 else None
+    chunk = int(arguments[2]) if len(arguments) > 2 else 256
+    started = time.perf_counter()
+    totals = summarize(grade_file(arguments[0], pool_size, chunk))
+    elapsed = time.perf_counter() - started
+    print("%d puzzles in %.1f s (%.0f puzzles/s), %d solved by logic, mean score %.1f"
+          % (totals["puzzles"], elapsed, totals["puzzles"] / elapsed if elapsed else 0.0, totals["solved"],
+             totals["mean_score"]))
+    for difficulty in DIFFICULTIES:
+        print("%-8s %d" % (difficulty, totals["levels"][difficulty]))
+    print("%-14s %12s %12s" % ("technique", "steps", "seconds"))
+    for name in TECHNIQUES:
+        print("%-14s %12d %12.3f" % (name, totals["counts"][name], totals["times"][name]))
@@ -0,0 +1,297 @@
+# -*- coding: utf-8 -*-
+"""
+Pencil marks and next-step hints for a board being played, computed off the UI thread.
+
+A HintState follows the board move by move: ConflictTracker counts the numbers of every unit, and
+a move only recomputes the options of the cell it changed and of that cell's peers. The options left
+by the placed numbers are the pencil marks, and the hint is the first of a naked single, a hidden single
+(as SudokuSolver.check_for_unique_number finds them) or a single found after the naked and hidden
+subset search of SudokuSubsets, which skips the units whose options are the same as when it last
+found them stable. When none applies, the hint points at the cell with the fewest options, where
+a guess is needed.
+
+HintWorker computes hints on a daemon thread, keeping one HintState. Every submit() starts a new
+generation: a newer board replaces a pending one, a computation in progress stops at its next
+checkpoint (between techniques, and between units in the subset search) once it is stale, and
+only results of the latest generation are handed out by poll(), which the UI calls from its own
+thread (from a Tk after() callback), so no widget is ever touched by the worker.
+"""
+import threading
+from collections import OrderedDict
+
+from SudokuBoard import Board, format_number
+from SudokuGeometry import get_geometry
+from SudokuSolver import SudokuSolver
+from SudokuSubsets import SubsetEngine
+
+
+CACHE_SIZE = 256
+TECHNIQUE_NAMES = {"naked_single": "naked single", "hidden_single": "hidden single",
+                   "preemptive_set": "preemptive set", "guess": "guess", "dead_end": "dead end",
+                   "conflict": "conflict", "solved": "solved"}
+
+
+class Cancelled(Exception):
+    """
+    Raised inside find_hint when its computation became stale.
+    """
+    pass
+
+
+def describe_hint(hint: dict) -> str:
+    # One line description of a hint for the player
+    technique, cell, number = hint["technique"], hint["cell"], hint["number"]
+    if technique == "solved":
+        return "The board is full."
+    if technique == "conflict":
+        return "A number is repeated in a row, column or box."
+    where = "Row %d, column %d" % (cell[0] + 1, cell[1] + 1)
+    if technique == "dead_end":
+        return "%s has no options left: an answer is wrong." % where
+    if technique == "guess":
+        return "No logical step left. %s has the fewest options." % where
+    number = format_number(number, hint["side_length"])
+    return "%s can only be %s (%s)." % (where, number, TECHNIQUE_NAMES[technique])
+
+
+def find_hint(board, cancelled=None) -> dict:
+    """
+    Pencil marks and next logical step of a board (rows of numbers), see HintState.find_hint.
+    """
+    return HintState(board).find_hint(cancelled)
+
+
+class ConflictTracker:
+    """
+    Counts of every number in every row, column and box of a board, updated one cell at a time.
+
+    A board is complete and valid exactly when every cell is filled and no unit holds a number twice,
+    so checking for a win is O(1) after each move.
+    """
+    def __init__(self, board):
+        self.geometry = get_geometry(len(board))
+        self.side_length = len(board)
+        self.reset(board)
+
+    def cell_conflicts(self, row, col, number):
+        """
+        Whether number at (row, col) is repeated in one of the cell's units.
+        """
+        return number != 0 and any(self.counts[unit][number] > 1 for unit in self.geometry.cell_units[row, col])
+
+    def is_solved(self):
+        return self.filled == self.side_length ** 2 and self.duplicates == 0
+
+    def reset(self, board):
+        """
+        Recount a whole board.
+        """
+        self.counts = [[0] * (self.side_length + 1) for _ in self.geometry.units]
+        # Numbers placed in each unit, bit n - 1 for number n
+        self.numbers = [0] * len(self.geometry.units)
+        self.filled = 0
+        # Number of extra copies of numbers over all units, 0 when no unit holds a number twice
+        self.duplicates = 0
+        for row in range(self.side_length):
+            for col in range(self.side_length):
+                self.update(row, col, 0, int(board[row][col]))
+
+    def update(self, row, col, old, new):
+        """
+        Account for the number at (row, col) changing from old to new (0 for an empty cell).
+        """
+        for unit in self.geometry.cell_units[row, col]:
+            counts = self.counts[unit]
+            if old:
+                counts[old] -= 1
+                if counts[old] >= 1:
+                    self.duplicates -= 1
+                else:
+                    self.numbers[unit] &= ~(1 << (old - 1))
+            if new:
+                if counts[new] >= 1:
+                    self.duplicates += 1
+                counts[new] += 1
+                self.numbers[unit] |= 1 << (new - 1)
+        self.filled += (new != 0) - (old != 0)
+
+
+class HintState:
+
+    def __init__(self, board):
+        # Board (rows of numbers, copied here), the numbers of its units and the options of its empty cells
+        self.board = Board.from_rows(board)
+        self.side_length = len(self.board)
+        self.geometry = get_geometry(self.side_length)
+        self.conflicts = ConflictTracker(self.board)
+        self.all_numbers = (1 << self.side_length) - 1
+        # Options left by the placed numbers, the pencil marks, of the empty cells
+        self.candidates = {}
+        for cell in self.geometry.cells:
+            self.update_candidates(cell)
+        # Options of every cell (0 when filled) narrowed by the subset search, which changes them through
+        # set_cell_options and remembers the units it found stable from one board to the next
+        self.cell_number_options = {}
+        self.subset_engine = SubsetEngine(self)
+
+    def find_hint(self, cancelled=None) -> dict:
+        """
+        Pencil marks and next logical step of the board.
+
+        Returns {"candidates": {cell: options bitmask} of the empty cells, "technique", "cell", "number",
+        "side_length"}, where cell and number are None when the technique names no cell or number.
+        cancelled, if given, is called between techniques and Cancelled is raised once it returns True.
+        """
+        def checkpoint():
+            if cancelled is not None and cancelled():
+                raise Cancelled
+
+        empty_cells = [cell for cell in self.geometry.cells if cell in self.candidates]
+        hint = {"candidates": dict(self.candidates), "technique": None, "cell": None, "number": None,
+                "side_length": self.side_length}
+        if self.conflicts.duplicates:
+            hint["technique"] = "conflict"
+            return hint
+        if not empty_cells:
+            hint["technique"] = "solved"
+            return hint
+        for cell in empty_cells:
+            if not self.candidates[cell]:
+                hint.update(technique="dead_end", cell=cell)
+                return hint
+        checkpoint()
+        options = self.cell_number_options = {cell: self.candidates.get(cell, 0) for cell in self.geometry.cells}
+        # Singles, first on the options left by the placed numbers, then on those left by subsets
+        for technique in ("naked_single", "preemptive_set"):
+            for cell in empty_cells:
+                if SudokuSolver.is_single(options[cell]):
+                    hint.update(technique=technique, cell=cell, number=options[cell].bit_length())
+                    return hint
+            checkpoint()
+            for cell in empty_cells:
+                unique_options = self.unique_options(cell)
+                if SudokuSolver.is_single(unique_options):
+                    hint.update(technique="hidden_single" if technique == "naked_single" else technique, cell=cell,
+                                number=unique_options.bit_length())
+                    return hint
+            checkpoint()
+            if technique == "naked_single":
+                self.subset_engine.reduce(cancelled)
+                checkpoint()
+        cell = min(empty_cells, key=lambda empty_cell: options[empty_cell].bit_count())
+        hint.update(technique="dead_end" if not options[cell] else "guess", cell=cell)
+        return hint
+
+    def set_cell_options(self, cell: tuple, number_options: int) -> None:
+        # Narrow the options of a cell, called by the subset search
+        self.cell_number_options[cell] = number_options
+
+    def unique_options(self, cell: tuple) -> int:
+        # Single number of the cell that no other cell of its row, column or box can take, else its options
+        options = self.cell_number_options
+        for unit in self.geometry.cell_units[cell]:
+            others = 0
+            for other in self.geometry.units[unit]:
+                if other != cell:
+                    others |= options[other]
+            if SudokuSolver.is_single(options[cell] & ~others):
+                return options[cell] & ~others
+        return options[cell]
+
+    def update(self, board) -> None:
+        # Move to another board of the same size, updating only the cells changed and their peers
+        board = Board.from_rows(board)
+        side_length = self.side_length
+        for index, (old, new) in enumerate(zip(self.board.cells, board.cells)):
+            if old != new:
+                cell = divmod(index, side_length)
+                self.board[cell] = new
+                self.conflicts.update(cell[0], cell[1], old, new)
+                self.update_candidates(cell)
+                for peer in self.geometry.peers[cell]:
+                    self.update_candidates(peer)
+
+    def update_candidates(self, cell: tuple) -> None:
+        # Options the placed numbers leave an empty cell
+        if self.board[cell]:
+            self.candidates.pop(cell, None)
+            return
+        numbers = self.conflicts.numbers
+        row_unit, column_unit, box_unit = self.geometry.cell_units[cell]
+        self.candidates[cell] = self.all_numbers & ~(numbers[row_unit] | numbers[column_unit] | numbers[box_unit])
+
+
+class HintWorker:
+
+    def __init__(self):
+        # Start the worker thread; hints of recently seen boards are cached
+        self.condition = threading.Condition()
+        self.generation = 0
+        # (generation, board) waiting to be computed, or None
+        self.pending = None
+        # (generation, hint) of the last computation that completed, or None
+        self.result = None
+        self.closed = False
+        self.cache = OrderedDict()
+        # Board last computed and its pencil marks, updated by the next board's moves
+        self.state = None
+        self.thread = threading.Thread(target=self.run, name="SudokuHints", daemon=True)
+        self.thread.start()
+
+    def close(self) -> None:
+        # Stop the worker thread after the computation in progress, if any
+        with self.condition:
+            self.closed = True
+            self.generation += 1
+            self.condition.notify()
+
+    def compute(self, generation: int, board: Board):
+        # Hint of a board, None if a newer board was submitted meanwhile
+        key = bytes(board)
+        if key in self.cache:
+            self.cache.move_to_end(key)
+            return self.cache[key]
+        if self.state is None or len(self.state.board) != len(board):
+            self.state = HintState(board)
+        else:
+            self.state.update(board)
+        try:
+            hint = self.state.find_hint(lambda: self.generation != generation)
+        except Cancelled:
+            return None
+        self.cache[key] = hint
+        if len(self.cache) > CACHE_SIZE:
+            self.cache.popitem(last=False)
+        return hint
+
+    def poll(self):
+        # Hint of the board last submitted once it is ready, else None; each hint is handed out once
+        with self.condition:
+            if self.result is None or self.result[0] != self.generation:
+                return None
+            hint = self.result[1]
+            self.result = None
+            return hint
+
+    def run(self) -> None:
+        while True:
+            with self.condition:
+                while self.pending is None and not self.closed:
+                    self.condition.wait()
+                if self.closed:
+                    return
+                generation, board = self.pending
+                self.pending = None
+            hint = self.compute(generation, board)
+            if hint is not None:
+                with self.condition:
+                    self.result = (generation, hint)
+
+    def submit(self, board) -> int:
+        # Queue a board (any rows of numbers, copied here) for a new hint, returns its generation
+        board = Board.from_rows(board)
+        with self.condition:
+            self.generation += 1
+            self.pending = (self.generation, board)
+            self.condition.notify()
+            return self.generation
@@ -0,0 +1,152 @@
+# -*- coding: utf-8 -*-
+"""
+Streaming import of puzzle files.
+
+Two line formats are read: "id: ((row), (row), ...)" as written by the default puzzle files,
+and one character per cell ('0' or '.' for empty cells), where the line number is the id. Cells
+of boards above 9x9 are letters in that format, see SudokuBoard.SYMBOLS; files using another
+alphabet (e.g. SudokuBoard.HEX_SYMBOLS for 16x16) are read by passing it as symbols.
+Files are memory-mapped and read one line at a time, every board is validated as it is parsed,
+and boards are written to the store in batches, so memory stays flat whatever the file size.
+"""
+import mmap
+import os.path
+import re
+from math import isqrt
+
+from SudokuBoard import SYMBOLS, parse_cells
+from SudokuGeometry import get_geometry
+
+
+BATCH_SIZE = 10000
+ROW_SEPARATOR = re.compile(r"\)\s*,\s*\(")
+
+
+def import_file(db_name: str, file_name: str, table_name: str, batch_size=BATCH_SIZE, errors="raise",
+                progress=None, symbols=SYMBOLS) -> dict:
+    """
+    Import every board of a puzzle file into a table of the store, batch_size boards per transaction.
+    Boards replace those already stored under the same ids.
+
+    Boards are validated first; with errors="skip" invalid lines are counted and left out. progress,
+    if given, is called after every batch as progress(boards imported, bytes read, file size).
+    symbols is the alphabet of lines with one character per cell.
+    Returns the counts of imported and skipped lines.
+    """
+    from SudokuStore import PuzzleStore
+    total_size = os.path.getsize(file_name)
+    imported, skipped = 0, 0
+    ids, boards = [], []
+    with PuzzleStore(db_name) as store:
+        position = 0
+        for puzzle_id, board, position in read_lines(file_name, True, errors, symbols):
+            if board is None:
+                skipped += 1
+                continue
+            ids.append(puzzle_id)
+            boards.append(board)
+            if len(boards) == batch_size:
+                store.add_many(table_name, boards, ids, replace=True)
+                imported += len(boards)
+                ids, boards = [], []
+                if progress is not None:
+                    progress(imported, position, total_size)
+        if boards:
+            store.add_many(table_name, boards, ids, replace=True)
+            imported += len(boards)
+        if progress is not None:
+            progress(imported, position, total_size)
+    return {"imported": imported, "skipped": skipped}
+
+
+def iter_lines(file_name: str):
+    # Yield (line number, raw line bytes, bytes read so far) for the non-empty lines of a file, through a memory map
+    with open(file_name, "rb") as f:
+        try:
+            data = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        except ValueError:
+            # Empty files cannot be mapped
+            return
+        with data:
+            for line_number, line in enumerate(iter(data.readline, b""), 1):
+                line = line.strip()
+                if line:
+                    yield line_number, line, data.tell()
+
+
+def parse_board(text: str) -> tuple:
+    # Parse a "((row), (row), ...)" board
+    text = text.strip()
+    if not (text.startswith("((") and text.endswith("))")):
+        raise ValueError("Board is not a tuple of rows")
+    rows = tuple(tuple(map(int, row.split(","))) for row in ROW_SEPARATOR.split(text[2:-2]))
+    if any(len(row) != len(rows) for row in rows):
+        raise ValueError("Board is not square")
+    return rows
+
+
+def parse_flat(line: str, symbols=SYMBOLS) -> tuple:
+    # Parse a line with one character per cell, '0' or '.' for empty cells
+    side_length = isqrt(len(line))
+    if side_length ** 2 != len(line):
+        raise ValueError("%d cells do not make a square board" % len(line))
+    values = parse_cells(line, symbols)
+    return tuple(tuple(values[r * side_length:(r + 1) * side_length]) for r in range(side_length))
+
+
+def parse_line(line: str, default_id: int, symbols=SYMBOLS) -> tuple:
+    # Parse a "id: ((...), ...)" line or a flat line with one character per cell, returns (id, board)
+    if ":" in line:
+        key, board = line.split(":", 1)
+        return int(key), parse_board(board)
+    return default_id, parse_flat(line, symbols)
+
+
+def read_lines(file_name: str, validate: bool, errors: str, symbols=SYMBOLS):
+    # Yield (id, board or None, bytes read so far) for every line, None for a line skipped with errors="skip"
+    if errors not in ("raise", "skip"):
+        raise ValueError("Unknown error handling: %r" % errors)
+    for line_number, line, position in iter_lines(file_name):
+        try:
+            # A line that is not ASCII raises UnicodeDecodeError, a ValueError, and is handled like any bad line
+            puzzle_id, board = parse_line(line.decode("ascii"), line_number, symbols)
+            if validate:
+                validate_board(board)
+        except ValueError as error:
+            if errors == "raise":
+                raise ValueError("%s, line %d: %s" % (file_name, line_number, error)) from None
+            yield line_number, None, position
+            continue
+        yield puzzle_id, board, position
+
+
+def read_puzzles(file_name: str, validate=False, errors="raise", symbols=SYMBOLS):
+    # Yield (id, board) pairs from a puzzle file, one line at a time. With errors="skip",
+    # lines that do not parse (or validate) are left out instead of raising ValueError.
+    for puzzle_id, board, _ in read_lines(file_name, validate, errors, symbols):
+        if board is not None:
+            yield puzzle_id, board
+
+
+def validate_board(board: tuple) -> None:
+    # Raise ValueError unless the board is a square of square side with numbers in range and no repeated givens
+    side_length = len(board)
+    if isqrt(side_length) ** 2 != side_length or side_length == 0:
+        raise ValueError("Side length %d is not a perfect square" % side_length)
+    box_of = get_geometry(side_length).box_of
+    # Bitmasks of the numbers given in each row, column and box
+    rows, columns, boxes = [0] * side_length, [0] * side_length, [0] * side_length
+    for r, row in enumerate(board):
+        if len(row) != side_length:
+            raise ValueError("Board is not square")
+        for c, number in enumerate(row):
+            if not number:
+                continue
+            if not 0 < number <= side_length:
+                raise ValueError("Number %d out of range" % number)
+            bit = 1 << (number - 1)
+            if (rows[r] | columns[c] | boxes[box_of[r][c]]) & bit:
+                raise ValueError("Repeated number %d in a row, column or box" % number)
+            rows[r] |= bit
+            columns[c] |= bit
+            boxes[box_of[r][c]] |= bit
@@ -0,0 +1,369 @@
+# -*- coding: utf-8 -*-
+"""
+Local solving service: HTTP/JSON over TCP or a Unix socket, solves on a process pool.
+
+    POST /solve     {"board": [[...], ...] or "53..7....", "timeout": 2.0, "engine": "dlx"}
+                    -> {"status": "solved" | "unsolvable" | "timeout", "solution": [[...], ...] or null,
+                        "coalesced": bool, "time": seconds}
+    GET  /metrics   request, coalescing, queue and latency figures
+    GET  /health    {"status": "ok"}
+
+Identical boards in flight are solved once and every request waiting on them gets the result.
+Every solve stops at the deadline of the request that started it, so a board nobody waits for any
+longer does not keep a worker busy; a request that joined it and still has time left solves it again.
+Workers enforce the deadline with an interval timer, where the platform has one (not on Windows).
+Nothing but the standard library is used, so the service and its client run anywhere:
+
+    python SudokuService.py serve --port 8765
+    python SudokuService.py load-test Puzzles.txt --port 8765 --concurrency 32
+"""
+import argparse
+import asyncio
+import json
+import math
+import os
+import signal
+import time
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+
+import SudokuImport
+import SudokuSolver as Ss
+from SudokuBoard import Board
+
+
+DEFAULT_TIMEOUT = 10.0
+LATENCY_WINDOW = 10000
+MAX_BODY = 1 << 20
+REASONS = {200: "OK", 400: "Bad Request", 404: "Not Found", 405: "Method Not Allowed", 413: "Payload Too Large",
+           500: "Internal Server Error"}
+
+
+def parse_board(board) -> tuple:
+    # Board of a request, as rows or as a string with one character per cell; raises ValueError
+    if isinstance(board, str):
+        board = SudokuImport.parse_flat(board.strip())
+    elif isinstance(board, list) and all(isinstance(row, list) for row in board):
+        board = tuple(tuple(int(number) for number in row) for row in board)
+    else:
+        raise ValueError("board must be a list of rows or a string")
+    SudokuImport.validate_board(board)
+    return board
+
+
+def percentile(values: list, fraction: float):
+    # Nearest-rank percentile of a list of values, None if it is empty
+    if not values:
+        return None
+    values = sorted(values)
+    return values[min(len(values) - 1, int(fraction * len(values)))]
+
+
+class SolveTimeout(Exception):
+    """
+    Raised in a worker process when a solve reaches its deadline.
+    """
+    pass
+
+
+def expire(signal_number, frame):
+    # SIGALRM handler of solve_board
+    raise SolveTimeout
+
+
+def solve_board(board: tuple, engine: str, deadline=None) -> tuple:
+    # Solve a board in a worker process before a time.time() deadline, returns (status, solution rows or None)
+    timed = deadline is not None and hasattr(signal, "setitimer")
+    previous = None
+    if deadline is not None and deadline <= time.time():
+        # Every request for the board gave up while it was queued
+        return "timeout", None
+    try:
+        # The timer is armed and disarmed inside the try, so an expiry at any point is caught;
+        # the timer fires once, so nothing can interrupt restoring the old handler
+        try:
+            if timed:
+                previous = signal.signal(signal.SIGALRM, expire)
+                signal.setitimer(signal.ITIMER_REAL, max(deadline - time.time(), 1e-6))
+            solution = Ss.SudokuSolver(Board.from_rows(board), engine=engine).solve()
+        finally:
+            if timed:
+                signal.setitimer(signal.ITIMER_REAL, 0)
+    except SolveTimeout:
+        return "timeout", None
+    finally:
+        if timed:
+            signal.signal(signal.SIGALRM, previous if previous is not None else signal.SIG_DFL)
+    if len(solution) == 0:
+        return "unsolvable", None
+    return "solved", [list(row) for row in solution]
+
+
+class SolverService:
+
+    def __init__(self, workers=None, default_timeout=DEFAULT_TIMEOUT, engine="dlx"):
+        # Service state; the process pool is started by start()
+        self.workers = workers or os.cpu_count()
+        self.default_timeout = default_timeout
+        self.engine = engine
+        self.executor = None
+        self.server = None
+        # Solves in flight, keyed by (engine, board bytes)
+        self.in_flight = {}
+        self.requests = 0
+        self.coalesced = 0
+        self.solved = 0
+        self.unsolvable = 0
+        self.timeouts = 0
+        self.errors = 0
+        self.latencies = deque(maxlen=LATENCY_WINDOW)
+        self.started = time.time()
+
+    async def close(self) -> None:
+        if self.server is not None:
+            self.server.close()
+            await self.server.wait_closed()
+        if self.executor is not None:
+            self.executor.shutdown(wait=False, cancel_futures=True)
+
+    def get_metrics(self) -> dict:
+        # Counters, queue depth (distinct boards waiting for or being solved) and latency percentiles in seconds
+        latencies = list(self.latencies)
+        return {"requests": self.requests, "coalesced": self.coalesced, "solved": self.solved,
+                "unsolvable": self.unsolvable, "timeouts": self.timeouts, "errors": self.errors,
+                "queue_depth": len(self.in_flight), "workers": self.workers, "uptime": time.time() - self.started,
+                "latency": {"p50": percentile(latencies, 0.5), "p90": percentile(latencies, 0.9),
+                            "p99": percentile(latencies, 0.99), "max": max(latencies, default=None),
+                            "samples": len(latencies)}}
+
+    async def handle_connection(self, reader, writer) -> None:
+        # Serve HTTP/1.1 requests on a connection until the client closes it
+        try:
+            while True:
+                request_line = await reader.readline()
+                if not request_line.strip():
+                    break
+                method, path, version = (request_line.decode("latin-1").split() + ["", "", ""])[:3]
+                headers = {}
+                while True:
+                    line = await reader.readline()
+                    if line in (b"\r\n", b"\n", b""):
+                        break
+                    name, _, value = line.decode("latin-1").partition(":")
+                    headers[name.strip().lower()] = value.strip()
+                try:
+                    length = int(headers.get("content-length", 0))
+                    if length < 0:
+                        raise ValueError
+                except ValueError:
+                    self.errors += 1
+                    await self.respond(writer, 400, {"error": "bad content-length"}, close=True)
+                    break
+                if length > MAX_BODY:
+                    await self.respond(writer, 413, {"error": "body too large"}, close=True)
+                    break
+                body = await reader.readexactly(length) if length else b""
+                status, payload = await self.route(method, path, body)
+                close = headers.get("connection", "").lower() == "close" or version == "HTTP/1.0"
+                await self.respond(writer, status, payload, close)
+                if close:
+                    break
+        except (ConnectionError, asyncio.IncompleteReadError, asyncio.CancelledError):
+            # Client gone, or the server shutting down
+            pass
+        finally:
+            writer.close()
+
+    @staticmethod
+    async def respond(writer, status: int, payload: dict, close=False) -> None:
+        body = json.dumps(payload).encode()
+        writer.write(("HTTP/1.1 %d %s\r\nContent-Type: application/json\r\nContent-Length: %d\r\n"
+                      "Connection: %s\r\n\r\n" % (status, REASONS[status], len(body),
+                                                   "close" if close else "keep-alive")).encode() + body)
+        await writer.drain()
+
+    async def route(self, method: str, path: str, body: bytes) -> tuple:
+        # (status, payload) of a request
+        if path == "/health":
+            return 200, {"status": "ok"}
+        if path == "/metrics":
+            return 200, self.get_metrics()
+        if path != "/solve":
+            return 404, {"error": "unknown path %s" % path}
+        if method != "POST":
+            return 405, {"error": "use POST"}
+        try:
+            request = json.loads(body)
+            if not isinstance(request, dict) or "board" not in request:
+                raise ValueError("missing board")
+            board = parse_board(request["board"])
+            timeout = float(request.get("timeout", self.default_timeout))
+            if not 0 < timeout < math.inf:
+                raise ValueError("timeout must be a positive number of seconds")
+            engine = request.get("engine", self.engine)
+            if engine not in Ss.ENGINES:
+                raise ValueError("unknown engine %r" % engine)
+        except (ValueError, TypeError) as error:
+            self.errors += 1
+            return 400, {"error": str(error)}
+        try:
+            return 200, await self.solve(board, timeout, engine)
+        except Exception as error:
+            self.errors += 1
+            return 500, {"error": repr(error)}
+
+    async def solve(self, board: tuple, timeout: float, engine: str) -> dict:
+        # Solve a board, joining the solve of an identical board already in flight
+        start = time.perf_counter()
+        deadline = time.time() + timeout
+        self.requests += 1
+        key = (engine, bytes(Board.from_rows(board)))
+        coalesced = key in self.in_flight
+        if coalesced:
+            self.coalesced += 1
+        status, solution = "timeout", None
+        while status == "timeout" and deadline > time.time():
+            future = self.in_flight.get(key)
+            if future is None:
+                future = asyncio.get_running_loop().run_in_executor(self.executor, solve_board, board, engine,
+                                                                    deadline)
+                self.in_flight[key] = future
+                future.add_done_callback(lambda done: self.in_flight.pop(key, None)
+                                         if self.in_flight.get(key) is done else None)
+            try:
+                # shield keeps the solve going for the other waiters when this request times out
+                status, solution = await asyncio.wait_for(asyncio.shield(future), deadline - time.time())
+            except asyncio.TimeoutError:
+                break
+            # A timeout here is the deadline of the request that started the solve, retried while time is left
+        if status == "timeout":
+            self.timeouts += 1
+        elif status == "unsolvable":
+            self.unsolvable += 1
+        else:
+            self.solved += 1
+        elapsed = time.perf_counter() - start
+        self.latencies.append(elapsed)
+        return {"status": status, "solution": solution, "coalesced": coalesced, "time": elapsed}
+
+    async def start(self, host="127.0.0.1", port=8765, socket_path=None) -> None:
+        # Start the pool and listen on a TCP port, or on a Unix socket if socket_path is given
+        self.executor = ProcessPoolExecutor(self.workers)
+        if socket_path is not None:
+            self.server = await asyncio.start_unix_server(self.handle_connection, socket_path)
+        else:
+            self.server = await asyncio.start_server(self.handle_connection, host, port)
+
+
+class ServiceClient:
+
+    def __init__(self, host="127.0.0.1", port=8765, socket_path=None):
+        # Client keeping one HTTP connection to the service open
+        self.host = host
+        self.port = port
+        self.socket_path = socket_path
+        self.reader = None
+        self.writer = None
+
+    async def close(self) -> None:
+        if self.writer is not None:
+            self.writer.close()
+            await self.writer.wait_closed()
+            self.reader = self.writer = None
+
+    async def get_metrics(self) -> dict:
+        return await self.request("GET", "/metrics")
+
+    async def request(self, method: str, path: str, payload=None) -> dict:
+        # Send a request and return the decoded JSON response
+        if self.writer is None:
+            if self.socket_path is not None:
+                self.reader, self.writer = await asyncio.open_unix_connection(self.socket_path)
+            else:
+                self.reader, self.writer = await asyncio.open_connection(self.host, self.port)
+        body = json.dumps(payload).encode() if payload is not None else b""
+        self.writer.write(("%s %s HTTP/1.1\r\nHost: localhost\r\nContent-Type: application/json\r\n"
+                           "Content-Length: %d\r\n\r\n" % (method, path, len(body))).encode() + body)
+        await self.writer.drain()
+        await self.reader.readline()
+        length = 0
+        while True:
+            line = await self.reader.readline()
+            if line in (b"\r\n", b"\n", b""):
+                break
+            name, _, value = line.decode("latin-1").partition(":")
+            if name.strip().lower() == "content-length":
+                length = int(value)
+        return json.loads(await self.reader.readexactly(length))
+
+    async def solve(self, board, timeout=None, engine=None) -> dict:
+        # Solve a board (rows or a one character per cell string) on the service
+        payload = {"board": board if isinstance(board, str) else [list(map(int, row)) for row in board]}
+        if timeout is not None:
+            payload["timeout"] = timeout
+        if engine is not None:
+            payload["engine"] = engine
+        return await self.request("POST", "/solve", payload)
+
+
+async def load_test(boards: list, concurrency=16, host="127.0.0.1", port=8765, socket_path=None) -> dict:
+    # Solve every board with concurrency clients in parallel, returns throughput and the service metrics
+    queue = asyncio.Queue()
+    for board in boards:
+        queue.put_nowait(board)
+    statuses = {}
+
+    async def worker():
+        client = ServiceClient(host, port, socket_path)
+        try:
+            while not queue.empty():
+                response = await client.solve(queue.get_nowait())
+                statuses[response["status"]] = statuses.get(response["status"], 0) + 1
+        finally:
+            await client.close()
+
+    start = time.perf_counter()
+    await asyncio.gather(*(worker() for _ in range(concurrency)))
+    elapsed = time.perf_counter() - start
+    client = ServiceClient(host, port, socket_path)
+    metrics = await client.get_metrics()
+    await client.close()
+    return {"boards": len(boards), "seconds": elapsed, "throughput": len(boards) / elapsed, "statuses": statuses,
+            "metrics": metrics}
+
+
+async def serve(host: str, port: int, socket_path=None, workers=None, timeout=DEFAULT_TIMEOUT) -> None:
+    # Run the service until interrupted
+    service = SolverService(workers, timeout)
+    await service.start(host, port, socket_path)
+    print("Serving on %s" % (socket_path or "http://%s:%d" % (host, port)))
+    try:
+        await service.server.serve_forever()
+    finally:
+        await service.close()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Local sudoku solving service.")
+    parser.add_argument("command", choices=("serve", "load-test"))
+    parser.add_argument("puzzle_file", nargs="?", help="puzzles to send (load-test)")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8765)
+    parser.add_argument("--socket", help="Unix socket path instead of TCP")
+    parser.add_argument("--workers", type=int, help="solver processes (serve)")
+    parser.add_argument("--timeout", type=float, default=DEFAULT_TIMEOUT, help="default per-request timeout (serve)")
+    parser.add_argument("--concurrency", type=int, default=16, help="parallel clients (load-test)")
+    parser.add_argument("--repeat", type=int, default=1, help="times every puzzle is sent (load-test)")
+    arguments = parser.parse_args()
+    if arguments.command == "serve":
+        try:
+            asyncio.run(serve(arguments.host, arguments.port, arguments.socket, arguments.workers, arguments.timeout))
+        except KeyboardInterrupt:
+            pass
+    else:
+        if not arguments.puzzle_file:
+            parser.error("load-test needs a puzzle file")
+        puzzles = [board for _, board in SudokuImport.read_puzzles(arguments.puzzle_file)] * arguments.repeat
+        result = asyncio.run(load_test(puzzles, arguments.concurrency, arguments.host, arguments.port,
+                                       arguments.socket))
+        print(json.dumps(result, indent=2))
@@ -0,0 +1,80 @@
+# -*- coding: utf-8 -*-
+"""
+Session state shared by the Sudoku objects of a process: the user index and open puzzle stores.
+
+Users.txt holds one user name per line. It is read once into a set, so a login is a set lookup,
+and new users are appended as they are created. Every user database gets one PuzzleStore,
+opened on first use and kept until the session is closed, so loading or switching puzzles
+runs an indexed query on an open connection. Writes grouped in store.transaction() commit once.
+"""
+import os.path
+
+from SudokuStore import PuzzleStore
+
+
+USERS_FILE = "Users.txt"
+
+
+class UserIndex:
+
+    def __init__(self, file_name=USERS_FILE):
+        # Names of the users listed in a file, one per line
+        self.file_name = file_name
+        self.users = set()
+        if os.path.isfile(file_name):
+            with open(file_name, "r") as f:
+                self.users = {line.strip() for line in f if line.strip()}
+
+    def __contains__(self, user_name):
+        return user_name in self.users
+
+    def __len__(self):
+        return len(self.users)
+
+    def add(self, user_name: str) -> None:
+        # Append a user to the file, starting a new line if the file does not end with one
+        if user_name in self.users:
+            return
+        separator = ""
+        if os.path.isfile(self.file_name) and os.path.getsize(self.file_name):
+            with open(self.file_name, "rb") as f:
+                f.seek(-1, os.SEEK_END)
+                if f.read(1) != b"\n":
+                    separator = "\n"
+        with open(self.file_name, "a") as f:
+            f.write(separator + user_name + "\n")
+        self.users.add(user_name)
+
+
+class Session:
+
+    def __init__(self, users_file=USERS_FILE):
+        # User index and the stores opened so far, keyed by database name
+        self.users = UserIndex(users_file)
+        self.stores = {}
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
+
+    def close(self) -> None:
+        # Close every store opened by the session
+        for store in self.stores.values():
+            store.close()
+        self.stores = {}
+
+    def get_store(self, db_name: str) -> PuzzleStore:
+        # The session's store of a database, opened on first use
+        store = self.stores.get(db_name)
+        if store is None:
+            store = self.stores[db_name] = PuzzleStore(db_name)
+        return store
+
+    def login(self, user_name: str, create_user) -> str:
+        # Log a user in, calling create_user(user_name) first if the user is not in the index yet
+        if user_name not in self.users:
+            create_user(user_name)
+            self.users.add(user_name)
+        return user_name
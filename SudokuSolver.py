@@ -4,93 +4,163 @@ Created on Thu Nov 26 20:14:42 2020
 
 @author: joaom
 """
-from random import randint
+from collections import deque
+from random import Random, randint
+from time import perf_counter
+from SudokuDLX import DancingLinks
+from SudokuGeometry import get_geometry
+from SudokuStats import SolverStats, check_hooks
+from SudokuSubsets import SubsetEngine
+
+
+BACKTRACKING_MODES = ("snapshot", "trail")
+ENGINES = ("auto", "propagation", "dlx")
+# Smallest side length solved by Dancing Links with engine="auto"
+AUTO_DLX_SIDE_LENGTH = 16
+PROPAGATION_MODES = ("queue", "sweep")
+STRATEGIES = ("search", "random")
+SUBSET_MODES = ("bitmask", "legacy")
 
 
 class SudokuSolver:
     
-    def __init__(self, puzzle):
+    def __init__(self, puzzle, backtracking="snapshot", strategy="search", seed=None, engine="auto",
+                 hooks=None, subsets="bitmask", propagation="queue"):
         # Initialize solver
+        # engine="propagation" solves by constraint propagation and guessing,
+        # engine="dlx" solves the equivalent exact cover problem with Dancing Links,
+        # engine="auto" uses Dancing Links from 16x16 up, where its cheaper search steps win, unless
+        # an option or hook of the propagation engine is asked for, and propagation below.
+        # backtracking="snapshot" saves a copy of the whole solver state for every guess,
+        # backtracking="trail" records only the changes made after each guess and undoes them.
+        # strategy="search" guesses deterministically on the cell with the fewest options and explores
+        # every branch, strategy="random" makes random guesses and gives up after 5000 passes.
+        # A seed breaks ties between equally good guesses at random, reproducibly.
+        # propagation="queue" examines only the cells whose peers changed since they were last examined,
+        # propagation="sweep" examines every empty cell on each pass until a whole pass changes nothing.
+        # subsets="bitmask" finds naked and hidden subsets of up to 4 cells in the units whose options changed,
+        # subsets="legacy" searches naked preemptive sets of up to 2 * box_length cells on the whole board.
+        # hooks maps SudokuStats.HOOK_EVENTS to callables notified as the solve goes.
+        if backtracking not in BACKTRACKING_MODES:
+            raise ValueError("Unknown backtracking mode: %r" % backtracking)
+        if strategy not in STRATEGIES:
+            raise ValueError("Unknown strategy: %r" % strategy)
+        if engine not in ENGINES:
+            raise ValueError("Unknown engine: %r" % engine)
+        if subsets not in SUBSET_MODES:
+            raise ValueError("Unknown subset mode: %r" % subsets)
+        if propagation not in PROPAGATION_MODES:
+            raise ValueError("Unknown propagation mode: %r" % propagation)
+        self.hooks = check_hooks(hooks)
+        if engine == "auto":
+            defaults = (backtracking, strategy, seed, subsets, propagation) == ("snapshot", "search", None, "bitmask",
+                                                                                "queue")
+            engine = "dlx" if len(puzzle.state) >= AUTO_DLX_SIDE_LENGTH and defaults and \
+                set(self.hooks) <= {"finish"} else "propagation"
+        self.engine = engine
+        self.strategy = strategy
+        self.random = Random(seed) if seed is not None else None
         self.sudoku = puzzle
         self.cell_number_options = {}
         self.empty_cells = []
+        # Saved states (snapshot mode) or trail positions (trail mode), one per guess
         self.States = []
+        # (container, key, old value) and (index, cell) undo entries, trail mode only
+        self.trail = [] if backtracking == "trail" else None
         self.side_length = len(self.sudoku.state)
         self.box_length = int(self.side_length ** 0.5)
+        # Cell, unit and peer tables shared by every solver of this size
+        self.geometry = get_geometry(self.side_length)
+        # Bitmasks of the numbers already placed in each row, column and box (bit n - 1 for number n)
+        self.row_numbers = [0] * self.side_length
+        self.column_numbers = [0] * self.side_length
+        self.box_numbers = [0] * self.side_length
+        # Cells waiting to be examined in queue mode
+        self.queue = None
+        self.queued = set()
         self.cells_without_update = 0
         self.looped_flg = False
         self.reverted_flg = False
-        self.start_cell_options()
+        # Set when the puzzle is shown to have no solution
+        self.unsolvable_flg = False
+        # First solution found by count_solutions
+        self.solution = []
+        # Techniques the solve needed: "naked_single", "hidden_single", "preemptive_set" and "guess"
+        self.techniques = set()
+        # Cells examined, options eliminated, guesses, reverts, search depth and phase times
+        self.stats = SolverStats()
+        if engine == "dlx":
+            self.exact_cover = DancingLinks(self.sudoku.state)
+        else:
+            self.start_cell_options()
+            self.subset_engine = SubsetEngine(self) if subsets == "bitmask" else None
+            if propagation == "queue":
+                self.queue = deque()
     
-    def check_column(self, cell: tuple) -> set:
+    def box_index(self, row: int, column: int) -> int:
+        # Index of the box containing the given cell
+        return self.geometry.box_of[row][column]
+
+    def check_column(self, cell: tuple) -> int:
         # Checks if any option in cell is unique in its column
-        number_options = self.cell_number_options[cell].copy()
-        for row in range(self.side_length):
-            if row != cell[0]:
-                number_options -= self.cell_number_options[row, cell[1]]
-        if not number_options:
-            # Empty set, return original set
-            return self.cell_number_options[cell].copy()
-        return number_options
+        return self.check_unit(cell, self.geometry.columns[cell[1]])
     
-    def check_row(self, cell: tuple) -> set:
+    def check_row(self, cell: tuple) -> int:
         # Checks if any option in cell is unique in its row
-        number_options = self.cell_number_options[cell].copy()
-        for column in range(self.side_length):
-            if column != cell[1]:
-                number_options -= self.cell_number_options[cell[0], column]
-        if not number_options:
-            # Empty set, return original set
-            return self.cell_number_options[cell].copy()
-        return number_options
+        return self.check_unit(cell, self.geometry.rows[cell[0]])
     
-    def check_box(self, cell: tuple) -> set:
+    def check_box(self, cell: tuple) -> int:
         # Checks if any option in cell is unique in its box
-        number_options = self.cell_number_options[cell].copy()
-        start_row = (cell[0] // self.box_length) * self.box_length
-        start_column = (cell[1] // self.box_length) * self.box_length
-        for row in range(start_row, start_row + self.box_length):
-            for column in range(start_column, start_column + self.box_length):
-                if (row, column) != cell:
-                    number_options -= self.cell_number_options[row, column]
+        return self.check_unit(cell, self.geometry.boxes[self.geometry.box_of[cell[0]][cell[1]]])
+
+    def check_unit(self, cell: tuple, unit: tuple) -> int:
+        # Checks if any option in cell is unique in the given unit (a tuple of cells containing it)
+        others = 0
+        for other in unit:
+            if other != cell:
+                others |= self.cell_number_options[other]
+        number_options = self.cell_number_options[cell] & ~others
         if not number_options:
-            # Empty set, return original set
-            return self.cell_number_options[cell].copy()
+            # Empty mask, return original mask
+            return self.cell_number_options[cell]
         return number_options
     
-    def check_for_unique_number(self, cell: tuple) -> set:
+    def check_for_unique_number(self, cell: tuple) -> int:
         # Check if there is a number in the given cell that can only exist there.
         # Check row for unique number
         new_cell_options = self.check_row(cell)
-        if len(new_cell_options) == 1:
+        if self.is_single(new_cell_options):
             return new_cell_options
         # Check column for unique number
         new_cell_options = self.check_column(cell)
-        if len(new_cell_options) == 1:
+        if self.is_single(new_cell_options):
             return new_cell_options
         # Check box for unique number
         new_cell_options = self.check_box(cell)
-        if len(new_cell_options) == 1:
+        if self.is_single(new_cell_options):
             return new_cell_options
-        return self.cell_number_options[cell].copy()
+        return self.cell_number_options[cell]
 
     def check_for_preemptive_sets(self, cell_options: dict) -> None:
         # Check for preemptive sets if worth it
         if len(cell_options) > 2:
             new_cell_options = self.check_preemptive_sets(cell_options, self.box_length * 2)
             for cell in new_cell_options:
-                self.cell_number_options[cell] = new_cell_options[cell]
+                if new_cell_options[cell] != self.cell_number_options[cell]:
+                    self.stats.eliminations["preemptive_set"] += \
+                        (self.cell_number_options[cell] & ~new_cell_options[cell]).bit_count()
+                    self.set_cell_options(cell, new_cell_options[cell])
 
     def check_preemptive_sets(self, set_dict: dict, max_size: int) -> dict:
         # Check for preemptive sets in a set dictionary
-        sorted_dict = dict(sorted(set_dict.items(), key=lambda item: len(item[1])))
+        sorted_dict = dict(sorted(set_dict.items(), key=lambda item: item[1].bit_count()))
         for set_size in range(2, max_size + 1):
-            cells, union = self.join_sets([], set(), sorted_dict, set_size, set_size)
+            cells, union = self.join_sets([], 0, sorted_dict, set_size, set_size)
             if cells:
                 excluded_cells = {}
                 for cell in set_dict.keys():
                     if cell not in cells:
-                        sorted_dict.update({cell: set_dict[cell].difference(union)})
+                        sorted_dict.update({cell: set_dict[cell] & ~union})
                     else:
                         excluded_cells.update({cell: set_dict[cell]})
                         sorted_dict.pop(cell)
@@ -103,176 +173,428 @@ class SudokuSolver:
                     return excluded_cells
         return set_dict
         
-    def examine_cell(self, cell: tuple):
-        # Examine cell and act based on cell state
-        if not self.cell_number_options[cell]:
-            # Empty cell with no possible move, reverse guess
+    def count_solutions(self, limit=2) -> int:
+        # Count the puzzle's solutions, stopping as soon as limit is reached.
+        # The first solution found is kept in self.solution and left on the board.
+        if self.engine == "dlx":
+            found = self.exact_cover.count_solutions(limit)
+            if found:
+                self.write_board(self.exact_cover.get_solution())
+                self.solution = self.sudoku.state.copy()
+            return found
+        found = 0
+        while found < limit:
+            solution = self.solve()
+            if len(solution) == 0:
+                break
+            found += 1
+            if found == 1:
+                self.solution = solution.copy()
+            if found == limit or not self.States:
+                break
+            # Reject the solution as if it were a dead end and keep searching
+            self.revert_guess()
+        if found:
+            self.write_board(self.solution)
+        return found
+
+    def dead_end(self) -> None:
+        # Reverse the last guess, or prove the puzzle has no solution if there is none left
+        if not self.States:
+            self.unsolvable_flg = True
+        else:
+            # The restored board lacks the guessed number, so the stall count starts over
             self.revert_guess()
-            self.reduce_options(cell)
             self.reverted_flg = True
             self.looped_flg = False
-        elif len(self.cell_number_options[cell]) == 1:
+            self.cells_without_update = 0
+
+    def enqueue_empty_cells(self) -> None:
+        # Queue every empty cell, after the board was restored to an earlier state
+        self.queue.clear()
+        self.queue.extend(self.empty_cells)
+        self.queued = set(self.empty_cells)
+
+    def examine_cell(self, cell: tuple):
+        # Examine cell and act based on cell state
+        self.stats.cells_examined += 1
+        number_options = self.get_cell_number_options(self.cell_number_options[cell], *cell)
+        if number_options != self.cell_number_options[cell]:
+            # Drop the options taken by cells filled since the last visit
+            self.cells_without_update = 0
+            self.stats.eliminations["basic"] += (self.cell_number_options[cell] & ~number_options).bit_count()
+            self.set_cell_options(cell, number_options)
+        if not number_options:
+            # Empty cell with no possible move, reverse guess
+            self.dead_end()
+            if not self.unsolvable_flg:
+                self.reduce_options(cell)
+        elif self.is_single(number_options):
             # Only one option left
+            self.techniques.add("naked_single")
             self.fill_cell(cell)
         else:
             # Multiple options left
-            if self.cells_without_update == len(self.empty_cells):
+            if self.cells_without_update >= len(self.empty_cells):
                 self.looped_flg = True
             self.reduce_options(cell)
         
+    def examine_queued_cell(self, cell: tuple) -> None:
+        # Drop the options taken by the cell's peers, then fill it if it has a naked or hidden single
+        self.stats.cells_examined += 1
+        number_options = self.get_cell_number_options(self.cell_number_options[cell], *cell)
+        if number_options != self.cell_number_options[cell]:
+            self.stats.eliminations["basic"] += (self.cell_number_options[cell] & ~number_options).bit_count()
+            self.set_cell_options(cell, number_options)
+        if not number_options:
+            # Empty cell with no possible move
+            self.dead_end()
+            return
+        technique = "naked_single"
+        if not self.is_single(number_options):
+            unique_options = self.check_for_unique_number(cell)
+            if not self.is_single(unique_options):
+                return
+            self.stats.eliminations["unique_number"] += (number_options & ~unique_options).bit_count()
+            self.set_cell_options(cell, unique_options)
+            technique = "hidden_single"
+        self.techniques.add(technique)
+        self.fill_cell(cell)
+
     def fill_cell(self, cell: tuple) -> None:
         # Fill cell
-        self.sudoku.state[cell] = self.cell_number_options[cell].pop()
+        self.place_number(cell, self.cell_number_options[cell])
+        self.set_cell_options(cell, 0)
         # Remove cell from list of empty cells
-        self.empty_cells.remove(cell)
+        self.remove_empty_cell(cell)
 
-    def get_cell_number_options(self, current_options: set, row: int, column: int) -> set:
-        # Get the list of numbers that can fill the cell
+    def finish_solve(self, start: float, solution):
+        # Close the stats of a solve() call and notify the "finish" hook, then return the solution
+        self.stats.finish(start)
+        if "finish" in self.hooks:
+            self.hooks["finish"](self, len(solution) != 0)
+        return solution
+
+    def get_cell_number_options(self, current_options: int, row: int, column: int) -> int:
+        # Get the mask of numbers that can fill the cell
         row_numbers = self.get_numbers_in_row(row)
         column_numbers = self.get_numbers_in_column(column)
         box_numbers = self.get_numbers_in_box(row, column)
-        return current_options - row_numbers - column_numbers - box_numbers
-
-    def get_numbers_in_box(self, row: int, column: int) -> set:
-        # Get the numbers of the filled cells in the current box
-        start_row, start_column = row // self.box_length * self.box_length, column // self.box_length * self.box_length
-        number_set = set()
-        for row in range(start_row, start_row + self.box_length):
-            for column in range(start_column, start_column + self.box_length):
-                if self.sudoku.state[row, column] != 0:
-                    number_set.add(self.sudoku.state[row, column])
-        return number_set
-
-    def get_numbers_in_column(self, column: int) -> set:
-        # Get the numbers of the filled cells in the current box
-        number_set = set()
-        for row in range(self.side_length):
-            if self.sudoku.state[row, column] != 0:
-                number_set.add(self.sudoku.state[row, column])
-        return number_set
-
-    def get_numbers_in_row(self, row: int) -> set:
-        # Get the numbers of the filled cells in the current box
-        number_set = set()
-        for column in range(self.side_length):
-            if self.sudoku.state[row, column] != 0:
-                number_set.add(self.sudoku.state[row, column])
-        return number_set
+        return current_options & ~(row_numbers | column_numbers | box_numbers)
+
+    def get_numbers_in_box(self, row: int, column: int) -> int:
+        # Get the mask of numbers of the filled cells in the current box
+        return self.box_numbers[self.box_index(row, column)]
+
+    def get_numbers_in_column(self, column: int) -> int:
+        # Get the mask of numbers of the filled cells in the current column
+        return self.column_numbers[column]
+
+    def get_numbers_in_row(self, row: int) -> int:
+        # Get the mask of numbers of the filled cells in the current row
+        return self.row_numbers[row]
 
     def get_preemptive_sets(self):
         # Find the preemptive sets in the sudoku puzzle
         previous_cell_options = self.cell_number_options.copy()
         for number in range(self.side_length):
-            # Check row
-            cell_options = {}
-            for column in range(self.side_length):
-                if self.sudoku.state[number, column] == 0:
-                    cell_options.update({(number, column): self.cell_number_options[number, column]})
-            self.check_for_preemptive_sets(cell_options)
-            # Check column
-            cell_options = {}
-            for row in range(self.side_length):
-                if self.sudoku.state[row, number] == 0:
-                    cell_options.update({(row, number): self.cell_number_options[row, number]})
-            self.check_for_preemptive_sets(cell_options)
-            # Check box
-            cell_options = {}
-            for num in range(self.side_length):
-                row = (number // self.box_length) * self.box_length + num // self.box_length
-                column = (number % self.box_length) * self.box_length + num % self.box_length
-                if self.sudoku.state[row, column] == 0:
-                    cell_options.update({(row, column): self.cell_number_options[row, column]})
-            self.check_for_preemptive_sets(cell_options)
+            # Check row, column and box
+            for unit in (self.geometry.rows[number], self.geometry.columns[number], self.geometry.boxes[number]):
+                cell_options = {cell: self.cell_number_options[cell] for cell in unit if self.sudoku.state[cell] == 0}
+                self.check_for_preemptive_sets(cell_options)
         if previous_cell_options != self.cell_number_options:
             self.cells_without_update = 0
             self.get_preemptive_sets()
 
-    def join_sets(self, group: list, number_set: set, set_dict: dict, set_size: int, groups_left: int):
+    def guess(self, cell: tuple, choice: int) -> None:
+        # Save the current state without the chosen number, then place it in the cell
+        self.set_cell_options(cell, self.cell_number_options[cell] & ~choice)
+        self.save_state()
+        # Update information on guessed cell
+        self.techniques.add("guess")
+        self.stats.guesses += 1
+        if len(self.States) > self.stats.max_depth:
+            self.stats.max_depth = len(self.States)
+        if "guess" in self.hooks:
+            self.hooks["guess"](self, cell, choice.bit_length(), len(self.States))
+        self.cells_without_update = 0
+        self.place_number(cell, choice)
+        self.set_cell_options(cell, 0)
+        self.remove_empty_cell(cell)
+        self.looped_flg = False
+
+    @staticmethod
+    def is_single(number_options: int) -> bool:
+        # Check if the mask holds exactly one number
+        return number_options != 0 and number_options & (number_options - 1) == 0
+
+    def join_sets(self, group: list, number_set: int, set_dict: dict, set_size: int, groups_left: int):
         for key, value in set_dict.items():
-            union = number_set.union(value)
-            if len(union) <= set_size and groups_left > 1:
+            union = number_set | value
+            if union.bit_count() <= set_size and groups_left > 1:
                 new_set_dict = dict(list(set_dict.items())[list(set_dict.items()).index((key, value)) + 1:])
                 return self.join_sets(group + [key], union, new_set_dict, set_size, groups_left - 1)
-            elif len(union) == set_size and groups_left == 1:
+            elif union.bit_count() == set_size and groups_left == 1:
                 return group + [key], union
-        return [], {}
+        return [], 0
+
+    def mrv_guess(self) -> None:
+        # Guess on the empty cell with the fewest options, trying its least constraining number first
+        best_cells = []
+        for cell in self.empty_cells:
+            number_options = self.get_cell_number_options(self.cell_number_options[cell], *cell)
+            if number_options != self.cell_number_options[cell]:
+                self.stats.eliminations["basic"] += (self.cell_number_options[cell] & ~number_options).bit_count()
+                self.set_cell_options(cell, number_options)
+            if not number_options:
+                self.dead_end()
+                return
+            if not best_cells or number_options.bit_count() < best_cells[0][1].bit_count():
+                best_cells = [(cell, number_options)]
+            elif number_options.bit_count() == best_cells[0][1].bit_count():
+                best_cells.append((cell, number_options))
+        cell, number_options = best_cells[0] if self.random is None else self.random.choice(best_cells)
+        # Count how often each option appears among the cell's empty peers
+        peer_options = [self.cell_number_options[peer] for peer in self.geometry.peers[cell]]
+        choices = [1 << n for n in range(number_options.bit_length()) if number_options >> n & 1]
+        if self.random is not None:
+            self.random.shuffle(choices)
+        choice = min(choices, key=lambda bit: sum(1 for options in peer_options if options & bit))
+        self.guess(cell, choice)
+
+    def place_number(self, cell: tuple, number_bit: int) -> None:
+        # Write the number to the board and mark it as used in the cell's row, column and box
+        box = self.box_index(*cell)
+        if self.trail is not None and self.States:
+            self.trail.extend(((self.sudoku.state, cell, 0), (self.row_numbers, cell[0], self.row_numbers[cell[0]]),
+                               (self.column_numbers, cell[1], self.column_numbers[cell[1]]),
+                               (self.box_numbers, box, self.box_numbers[box])))
+        self.sudoku.state[cell] = number_bit.bit_length()
+        self.row_numbers[cell[0]] |= number_bit
+        self.column_numbers[cell[1]] |= number_bit
+        self.box_numbers[box] |= number_bit
 
     @staticmethod
-    def random_choice(options: set) -> int:
-        # Choose a number given the list of all possible choices
-        options = list(options)
+    def random_choice(options: int) -> int:
+        # Choose a number bit given the mask of all possible choices
+        options = [1 << n for n in range(options.bit_length()) if options >> n & 1]
         return options[randint(0, len(options) - 1)]
     
     def random_guess(self) -> None:
         # Make a random guess to proceed with sudoku solving
-        sorted_cells_by_options = dict(sorted(self.cell_number_options.items(), key=lambda item: len(item[1])))
+        sorted_cells_by_options = dict(sorted(self.cell_number_options.items(), key=lambda item: item[1].bit_count()))
         for cell in sorted_cells_by_options:
             if cell in self.empty_cells:
-                choice = self.random_choice(self.cell_number_options[cell])
-                self.cell_number_options[cell].remove(choice)
-                # Save current state
-                self.States.append([self.sudoku.state.copy(), self.cell_number_options.copy(), self.empty_cells.copy()])
-                # Update information on guessed cell
-                self.cells_without_update = 0
-                self.sudoku.state[cell] = choice
-                self.cell_number_options[cell] = set()
-                self.empty_cells.remove(cell)
-                self.looped_flg = False
+                if not self.cell_number_options[cell]:
+                    self.dead_end()
+                else:
+                    self.guess(cell, self.random_choice(self.cell_number_options[cell]))
                 break
     
     def reduce_options(self, cell: tuple) -> None:
         # More than one option for cell, reduce list of possible numbers
         number_options = self.get_cell_number_options(self.cell_number_options[cell], *cell)
+        technique = "naked_single"
         if number_options == self.cell_number_options[cell]:
             # Deploy additional techniques to reduce list of possible numbers
             number_options = self.check_for_unique_number(cell)
+            technique = "hidden_single"
         if number_options != self.cell_number_options[cell]:
             # Update cell options
             self.cells_without_update = 0
-            self.cell_number_options[cell] = number_options.copy()
-            if len(number_options) == 1:
+            self.stats.eliminations["basic" if technique == "naked_single" else "unique_number"] += \
+                (self.cell_number_options[cell] & ~number_options).bit_count()
+            self.set_cell_options(cell, number_options)
+            if self.is_single(number_options):
+                self.techniques.add(technique)
                 self.fill_cell(cell)
             self.looped_flg = False
     
+    def reduce_subsets(self) -> None:
+        # Eliminate options with naked and hidden subsets in the units that changed since the last search.
+        # Options must be up to date with the placed numbers first, or stale ones would fake hidden subsets.
+        for cell in self.empty_cells:
+            number_options = self.get_cell_number_options(self.cell_number_options[cell], *cell)
+            if number_options != self.cell_number_options[cell]:
+                self.stats.eliminations["basic"] += (self.cell_number_options[cell] & ~number_options).bit_count()
+                self.set_cell_options(cell, number_options)
+        eliminated = self.subset_engine.reduce()
+        if eliminated:
+            self.cells_without_update = 0
+            self.stats.eliminations["preemptive_set"] += eliminated
+
+    def remove_empty_cell(self, cell: tuple) -> None:
+        # Remove a filled cell from the list of empty cells
+        index = self.empty_cells.index(cell)
+        if self.trail is not None and self.States:
+            self.trail.append((index, cell))
+        del self.empty_cells[index]
+
     def revert_guess(self):
         # Revert to previous state due to incorrect choice
-        state = self.States.pop(-1)
-        # Update state
+        self.stats.reverts += 1
+        if "revert" in self.hooks:
+            self.hooks["revert"](self, len(self.States))
+        if self.trail is not None:
+            self.undo_trail(self.States.pop(-1))
+        else:
+            self.restore_state(self.States.pop(-1))
+        if self.queue is not None:
+            self.enqueue_empty_cells()
+
+    def restore_state(self, state: list) -> None:
+        # Restore a state saved by save_state in snapshot mode
         self.sudoku.state = state[0]
         self.cell_number_options = state[1]
         self.empty_cells = state[2]
+        self.row_numbers = state[3]
+        self.column_numbers = state[4]
+        self.box_numbers = state[5]
         
+    def save_state(self) -> None:
+        # Save the current state before a guess
+        if self.trail is not None:
+            self.States.append(len(self.trail))
+        else:
+            self.States.append([self.sudoku.state.copy(), self.cell_number_options.copy(), self.empty_cells.copy(),
+                                self.row_numbers.copy(), self.column_numbers.copy(), self.box_numbers.copy()])
+
+    def set_cell_options(self, cell: tuple, number_options: int) -> None:
+        # Update the options of a cell, recording the old mask when a guess may need undoing
+        if self.trail is not None and self.States:
+            self.trail.append((self.cell_number_options, cell, self.cell_number_options[cell]))
+        self.cell_number_options[cell] = number_options
+        if self.queue is not None:
+            # The cell may now be a single, its peers may have lost an option or gained a hidden single.
+            # Filled cells are skipped when they leave the queue.
+            if cell not in self.queued:
+                self.queued.add(cell)
+                self.queue.append(cell)
+            for peer in self.geometry.peers[cell]:
+                if peer not in self.queued:
+                    self.queued.add(peer)
+                    self.queue.append(peer)
+
     def solve(self):
-        # Solve sudoku puzzle
+        # Solve sudoku puzzle, returns [] if it has no solution (or the random strategy gives up)
+        start = perf_counter()
+        if self.engine == "dlx":
+            return self.solve_exact_cover(start)
+        if self.queue is not None:
+            return self.solve_queue(start)
         counter = 0
-        while len(self.empty_cells) != 0:
+        while len(self.empty_cells) != 0 and not self.unsolvable_flg:
             # New loop
             counter += 1
-            if counter == 5000:
-                # print("Counter full!\n", self.cell_number_options)
-                return []
+            if self.strategy == "random" and counter == 5000:
+                if "give_up" in self.hooks:
+                    self.hooks["give_up"](self)
+                return self.finish_solve(start, [])
             # For each empty cell
             for cell in self.empty_cells:
                 # Check list of possible numbers
                 self.cells_without_update += 1
                 self.examine_cell(cell)
+                if self.unsolvable_flg:
+                    break
                 if self.reverted_flg:
                     self.reverted_flg = False
                     break
                 if self.looped_flg:
                     # Resort to preemptive set search
-                    previous_cell_options = self.cell_number_options.copy()
-                    self.get_preemptive_sets()
-                    if previous_cell_options == self.cell_number_options:
-                        # Resort to random guessing
-                        self.random_guess()
+                    phase_start = perf_counter()
+                    eliminated = self.stats.eliminations["preemptive_set"]
+                    if self.subset_engine is not None:
+                        self.reduce_subsets()
+                    else:
+                        self.get_preemptive_sets()
+                    self.stats.add_time("preemptive_sets", phase_start)
+                    if self.stats.eliminations["preemptive_set"] != eliminated:
+                        self.techniques.add("preemptive_set")
+                        self.looped_flg = False
+                        if "preemptive_set" in self.hooks:
+                            self.hooks["preemptive_set"](self, self.stats.eliminations["preemptive_set"] - eliminated)
+                    else:
+                        phase_start = perf_counter()
+                        if self.strategy == "random":
+                            # Resort to random guessing
+                            self.random_guess()
+                        else:
+                            # Resort to searching
+                            self.mrv_guess()
+                        self.stats.add_time("guessing", phase_start)
+                        if self.unsolvable_flg or self.reverted_flg:
+                            self.reverted_flg = False
+                            break
+
+        if self.unsolvable_flg:
+            return self.finish_solve(start, [])
+        return self.finish_solve(start, self.sudoku.state)
 
-        return self.sudoku.state
+    def solve_exact_cover(self, start: float):
+        # Solve sudoku puzzle with Dancing Links, the whole search counts as guessing
+        solution = self.exact_cover.solve()
+        self.stats.guesses, self.stats.reverts = self.exact_cover.guesses, self.exact_cover.backtracks
+        self.stats.add_time("guessing", start)
+        if not solution:
+            return self.finish_solve(start, [])
+        self.write_board(solution)
+        return self.finish_solve(start, self.sudoku.state)
+
+    def solve_queue(self, start: float):
+        # Examine queued cells until the queue runs dry, then search subsets, then guess
+        self.enqueue_empty_cells()
+        stalls = 0
+        while self.empty_cells and not self.unsolvable_flg:
+            if self.queue:
+                cell = self.queue.popleft()
+                self.queued.discard(cell)
+                if not self.sudoku.state[cell]:
+                    self.examine_queued_cell(cell)
+                continue
+            stalls += 1
+            if self.strategy == "random" and stalls == 5000:
+                if "give_up" in self.hooks:
+                    self.hooks["give_up"](self)
+                return self.finish_solve(start, [])
+            # Resort to subset search, which queues the peers of every cell it changes
+            phase_start = perf_counter()
+            eliminated = self.stats.eliminations["preemptive_set"]
+            if self.subset_engine is not None:
+                self.reduce_subsets()
+            else:
+                self.get_preemptive_sets()
+            self.stats.add_time("preemptive_sets", phase_start)
+            if self.queue:
+                self.techniques.add("preemptive_set")
+                if "preemptive_set" in self.hooks:
+                    self.hooks["preemptive_set"](self, self.stats.eliminations["preemptive_set"] - eliminated)
+                continue
+            phase_start = perf_counter()
+            if self.strategy == "random":
+                self.random_guess()
+            else:
+                self.mrv_guess()
+            self.stats.add_time("guessing", phase_start)
+        if self.unsolvable_flg:
+            return self.finish_solve(start, [])
+        return self.finish_solve(start, self.sudoku.state)
 
     def start_cell_options(self):
         # Get information about the sudoku cells' states
-        numbers = set(range(1, self.side_length + 1))
-        # Fill list for each cell
+        numbers = (1 << self.side_length) - 1
+        # Mark the numbers given in each row, column and box
+        for r in range(self.side_length):
+            for c in range(self.side_length):
+                if self.sudoku.state[r, c] != 0:
+                    number_bit = 1 << (int(self.sudoku.state[r, c]) - 1)
+                    if (self.row_numbers[r] | self.column_numbers[c] | self.box_numbers[self.box_index(r, c)]) & number_bit:
+                        # Repeated number in a row, column or box
+                        self.unsolvable_flg = True
+                    self.row_numbers[r] |= number_bit
+                    self.column_numbers[c] |= number_bit
+                    self.box_numbers[self.box_index(r, c)] |= number_bit
+        # Fill mask for each cell
         for r in range(self.side_length):
             for c in range(self.side_length):
                 if self.sudoku.state[r, c] == 0:
@@ -281,4 +603,19 @@ class SudokuSolver:
                     # Update set of empty cells
                     self.empty_cells.append((r, c))
                 else:
-                    self.cell_number_options[(r, c)] = set()
+                    self.cell_number_options[(r, c)] = 0
+
+    def undo_trail(self, position: int) -> None:
+        # Undo the changes recorded on the trail after the given position, newest first
+        while len(self.trail) > position:
+            entry = self.trail.pop()
+            if len(entry) == 2:
+                self.empty_cells.insert(*entry)
+            else:
+                entry[0][entry[1]] = entry[2]
+
+    def write_board(self, board) -> None:
+        # Copy the numbers of a board (any object indexable as board[row][column]) to the puzzle
+        for r in range(self.side_length):
+            for c in range(self.side_length):
+                self.sudoku.state[r, c] = board[r][c]
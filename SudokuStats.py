@@ -0,0 +1,69 @@
+# -*- coding: utf-8 -*-
+"""
+Statistics and monitoring hooks of a SudokuSolver run.
+
+Every solver keeps a SolverStats in solver.stats. Hooks are passed to SudokuSolver as a dict
+{event: callable} and are called with the solver followed by the event's arguments:
+
+    "guess"           (solver, cell, number, depth)   a number is guessed at the given search depth
+    "revert"          (solver, depth)                 the guess at the given depth is undone
+    "preemptive_set"  (solver, eliminated)            a preemptive set search removed options
+    "give_up"         (solver,)                       the random strategy ran out of passes
+    "finish"          (solver, solved)                solve() returns
+
+Counters are plain attribute increments and hooks are looked up only on the events above,
+never per examined cell, so a solver without hooks pays next to nothing for them.
+"""
+from time import perf_counter
+
+
+HOOK_EVENTS = ("guess", "revert", "preemptive_set", "give_up", "finish")
+# Techniques whose eliminated options are counted, and the phases of a solve that are timed
+TECHNIQUES = ("basic", "unique_number", "preemptive_set")
+PHASES = ("propagation", "preemptive_sets", "guessing")
+
+
+def check_hooks(hooks) -> dict:
+    # Validate a {event: callable} dict of hooks
+    hooks = dict(hooks or {})
+    for event, hook in hooks.items():
+        if event not in HOOK_EVENTS:
+            raise ValueError("Unknown hook event: %r" % event)
+        if not callable(hook):
+            raise TypeError("Hook for %r is not callable" % event)
+    return hooks
+
+
+class SolverStats:
+
+    def __init__(self):
+        # Counters of a solve, accumulated over every call to solve()
+        self.cells_examined = 0
+        # Options removed by basic elimination, the unique number check and preemptive sets
+        self.eliminations = dict.fromkeys(TECHNIQUES, 0)
+        self.guesses = 0
+        self.reverts = 0
+        self.max_depth = 0
+        # Wall time in seconds; propagation is whatever solve() did outside the other phases
+        self.phase_times = dict.fromkeys(PHASES, 0.0)
+        self.total_time = 0.0
+
+    def __repr__(self):
+        return "SolverStats(%s)" % ", ".join("%s=%r" % item for item in self.as_dict().items())
+
+    def add_time(self, phase: str, start: float) -> None:
+        # Add the time elapsed since start to a phase
+        self.phase_times[phase] += perf_counter() - start
+
+    def as_dict(self) -> dict:
+        # Plain dict of the counters, e.g. to feed a metrics system
+        return {"cells_examined": self.cells_examined, "eliminations": self.eliminations.copy(),
+                "guesses": self.guesses, "reverts": self.reverts, "max_depth": self.max_depth,
+                "phase_times": self.phase_times.copy(), "total_time": self.total_time}
+
+    def finish(self, start: float) -> None:
+        # Close a solve() call started at start, crediting the untimed rest of it to propagation
+        elapsed = perf_counter() - start
+        timed = self.phase_times["preemptive_sets"] + self.phase_times["guessing"]
+        self.total_time += elapsed
+        self.phase_times["propagation"] = self.total_time - timed
@@ -0,0 +1,138 @@
+# -*- coding: utf-8 -*-
+"""
+Puzzle storage with one row per puzzle in a user's sqlite database.
+
+Boards are stored row-major as one byte per cell, keyed by puzzle id. Databases written by the
+previous layout (a whole pickled dict under one SqliteDict key per table) are migrated on open.
+A puzzle and its solution share one id. New boards get an id free in both tables, and writes
+only overwrite an existing id when asked to (replace=True), as imports do.
+"""
+import pickle
+import sqlite3
+from contextlib import contextmanager
+from itertools import chain
+from math import isqrt
+
+
+# Table names used by Sudoku and the sqlite tables holding them
+TABLES = {"puzzles": "sudoku_puzzles", "solutions": "sudoku_solutions"}
+SCHEMA_VERSION = 1
+
+
+def decode_board(data: bytes) -> tuple:
+    # Board stored as one byte per cell, row-major
+    side_length = isqrt(len(data))
+    return tuple(tuple(data[r * side_length:(r + 1) * side_length]) for r in range(side_length))
+
+
+def encode_board(board) -> bytes:
+    # One byte per cell, row-major
+    return bytes(chain.from_iterable(board))
+
+
+class PuzzleStore:
+
+    def __init__(self, db_name: str):
+        # Open (and if needed create or migrate) the store in the given sqlite file
+        self.db_name = db_name
+        self.connection = sqlite3.connect(db_name)
+        # Depth of nested transaction() blocks, the outermost one commits
+        self.depth = 0
+        with self.connection:
+            for table in TABLES.values():
+                self.connection.execute("CREATE TABLE IF NOT EXISTS %s (id INTEGER PRIMARY KEY, board BLOB NOT NULL)"
+                                        % table)
+        if self.connection.execute("PRAGMA user_version").fetchone()[0] < SCHEMA_VERSION:
+            self.migrate()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
+
+    def add(self, table_name: str, board, sudoku_number=None, replace=False) -> int:
+        # Insert a board under the given id, or the next id free in both tables, and return its id.
+        # An existing id raises sqlite3.IntegrityError unless replace is set.
+        with self.transaction():
+            if sudoku_number is None:
+                sudoku_number = self.next_id()
+            self.connection.execute("INSERT %sINTO %s (id, board) VALUES (?, ?)"
+                                    % ("OR REPLACE " if replace else "", TABLES[table_name]),
+                                    (sudoku_number, encode_board(board)))
+        return sudoku_number
+
+    def add_many(self, table_name: str, boards, ids=None, replace=False) -> list:
+        # Insert boards in a single transaction and return their ids, by default the next ids free in both tables.
+        # An existing id raises sqlite3.IntegrityError and rolls the batch back unless replace is set.
+        boards = [encode_board(board) for board in boards]
+        with self.transaction():
+            if ids is None:
+                first_id = self.next_id()
+                ids = list(range(first_id, first_id + len(boards)))
+            self.connection.executemany("INSERT %sINTO %s (id, board) VALUES (?, ?)"
+                                        % ("OR REPLACE " if replace else "", TABLES[table_name]), zip(ids, boards))
+        return list(ids)
+
+    def close(self) -> None:
+        self.connection.close()
+
+    def count(self, table_name: str) -> int:
+        return self.connection.execute("SELECT COUNT(*) FROM %s" % TABLES[table_name]).fetchone()[0]
+
+    def get(self, table_name: str, sudoku_number: int):
+        # Board with the given id, or None
+        row = self.connection.execute("SELECT board FROM %s WHERE id = ?" % TABLES[table_name],
+                                      (sudoku_number,)).fetchone()
+        return decode_board(row[0]) if row else None
+
+    def ids(self, table_name: str) -> list:
+        return [row[0] for row in self.connection.execute("SELECT id FROM %s ORDER BY id" % TABLES[table_name])]
+
+    def iter_puzzles(self, with_solutions=True):
+        # Yield (id, puzzle, solution or None) for every puzzle in increasing id order, streamed from one query
+        query = "SELECT p.id, p.board, %s FROM %s p %sORDER BY p.id" % (
+            ("s.board", TABLES["puzzles"], "LEFT JOIN %s s ON s.id = p.id " % TABLES["solutions"]) if with_solutions
+            else ("NULL", TABLES["puzzles"], ""))
+        for puzzle_id, puzzle, solution in self.connection.execute(query):
+            yield puzzle_id, decode_board(puzzle), decode_board(solution) if solution is not None else None
+
+    def migrate(self) -> None:
+        # Copy boards from the old SqliteDict layout, where table t holds the whole {id: board} dict under key t.
+        # The old tables are left in place.
+        with self.connection:
+            for table_name in TABLES:
+                exists = self.connection.execute("SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = ?",
+                                                 (table_name,)).fetchone()
+                if not exists:
+                    continue
+                row = self.connection.execute('SELECT value FROM "%s" WHERE key = ?' % table_name,
+                                              (table_name,)).fetchone()
+                if row:
+                    boards = pickle.loads(bytes(row[0]))
+                    self.connection.executemany("INSERT OR IGNORE INTO %s (id, board) VALUES (?, ?)"
+                                                % TABLES[table_name],
+                                                ((int(key), encode_board(board)) for key, board in boards.items()))
+            self.connection.execute("PRAGMA user_version = %d" % SCHEMA_VERSION)
+
+    def next_id(self) -> int:
+        # Lowest id above every puzzle and solution, so a new puzzle and its solution can share it
+        return self.connection.execute("SELECT MAX((SELECT COALESCE(MAX(id), 0) FROM %s), "
+                                       "(SELECT COALESCE(MAX(id), 0) FROM %s)) + 1"
+                                       % (TABLES["puzzles"], TABLES["solutions"])).fetchone()[0]
+
+    @contextmanager
+    def transaction(self):
+        # Group writes into one transaction, committed when the outermost block ends and rolled back on error
+        self.depth += 1
+        try:
+            yield self
+        except BaseException:
+            if self.depth == 1:
+                self.connection.rollback()
+            raise
+        else:
+            if self.depth == 1:
+                self.connection.commit()
+        finally:
+            self.depth -= 1
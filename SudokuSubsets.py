@@ -0,0 +1,103 @@
+# -*- coding: utf-8 -*-
+"""
+Naked and hidden subset detection on candidate bitmasks.
+
+A naked subset is k cells of a unit whose options together hold only k numbers: no other cell
+of the unit can take those numbers. A hidden subset is k numbers that together fit only k cells
+of a unit: those cells can take no other number. Subsets of 2 to max_size (4 by default) are
+searched with a depth-first enumeration that drops a branch as soon as its union holds more
+than k bits, and only up to half the open cells of the unit. Only units whose options changed
+since they were last found stable are examined, and every elimination queues the units of the
+changed cell again.
+"""
+from collections import deque
+from SudokuGeometry import get_geometry
+
+
+def find_subsets(masks: list, size: int):
+    # Every (indices, union) of size masks whose union has at most size bits (fewer is a dead end).
+    # Only masks with 2 to size bits can belong to such a subset.
+    items = [(index, mask) for index, mask in enumerate(masks) if 2 <= mask.bit_count() <= size]
+    stack = [(0, [], 0)]
+    while stack:
+        start, indices, union = stack.pop()
+        for position in range(start, len(items)):
+            index, mask = items[position]
+            joined = union | mask
+            if joined.bit_count() > size:
+                continue
+            if len(indices) + 1 == size:
+                yield indices + [index], joined
+            else:
+                stack.append((position + 1, indices + [index], joined))
+
+
+def number_positions(masks: list, side_length: int) -> list:
+    # Positions (bit i for masks[i]) where each number still fits, from the option masks of a unit's cells
+    positions = [0] * side_length
+    for i, mask in enumerate(masks):
+        while mask:
+            bit = mask & -mask
+            positions[bit.bit_length() - 1] |= 1 << i
+            mask ^= bit
+    return positions
+
+
+class SubsetEngine:
+
+    def __init__(self, solver, max_size=4):
+        # Subset search for a SudokuSolver, changing its options through set_cell_options
+        self.solver = solver
+        self.max_size = max_size
+        geometry = get_geometry(solver.side_length)
+        self.units = geometry.units
+        self.cell_units = geometry.cell_units
+        # Options of each unit when it was last found to hold no subset
+        self.stable = [None] * len(self.units)
+
+    def eliminate(self, unit: tuple) -> dict:
+        # New options of the cells of a unit changed by its smallest naked or hidden subset
+        options = self.solver.cell_number_options
+        masks = [options[cell] for cell in unit]
+        # A naked subset of k of the unit's n open cells leaves a hidden subset in the other n - k and
+        # the other way round, so sizes above n // 2 find nothing new
+        open_cells = sum(1 for mask in masks if mask)
+        for size in range(2, min(self.max_size, open_cells // 2) + 1):
+            for indices, union in find_subsets(masks, size):
+                changes = {unit[i]: masks[i] & ~union for i in range(len(unit))
+                           if i not in indices and masks[i] & union}
+                if changes:
+                    return changes
+            for numbers, union in find_subsets(number_positions(masks, self.solver.side_length), size):
+                numbers = sum(1 << n for n in numbers)
+                changes = {unit[i]: masks[i] & numbers for i in range(len(unit))
+                           if union >> i & 1 and masks[i] & ~numbers}
+                if changes:
+                    return changes
+        return {}
+
+    def reduce(self, cancelled=None) -> int:
+        # Apply subsets until every unit is stable, returns the number of options eliminated.
+        # cancelled, if given, is called before each unit, and the search stops once it returns True.
+        options = self.solver.cell_number_options
+        queue = deque(index for index, unit in enumerate(self.units)
+                      if self.stable[index] != tuple(options[cell] for cell in unit))
+        queued = set(queue)
+        eliminated = 0
+        while queue:
+            if cancelled is not None and cancelled():
+                break
+            index = queue.popleft()
+            queued.discard(index)
+            changes = self.eliminate(self.units[index])
+            if not changes:
+                self.stable[index] = tuple(options[cell] for cell in self.units[index])
+                continue
+            for cell, number_options in changes.items():
+                eliminated += (options[cell] & ~number_options).bit_count()
+                self.solver.set_cell_options(cell, number_options)
+                for unit_index in self.cell_units[cell]:
+                    if unit_index not in queued:
+                        queued.add(unit_index)
+                        queue.append(unit_index)
+        return eliminated
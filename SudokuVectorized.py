@@ -0,0 +1,100 @@
+# -*- coding: utf-8 -*-
+"""
+Vectorized constraint propagation over many boards at once.
+
+Boards are stacked in an (N, n, n) array and their candidates kept in an (N, n, n, n) boolean
+tensor, where candidates[b, r, c, d] means number d + 1 still fits cell (r, c) of board b.
+Naked and hidden singles are placed on every board in the same NumPy operations. Boards that
+propagation alone cannot finish are handed to SudokuSolver.
+"""
+from types import SimpleNamespace
+
+import numpy as np
+import SudokuSolver as Ss
+
+
+SOLVED, STALLED, UNSOLVABLE = 1, 0, -1
+
+
+def box_view(array: np.ndarray, box_length: int) -> np.ndarray:
+    # View an (N, n, n, ...) array as (N, box row, row in box, box column, column in box, ...)
+    shape = array.shape
+    return array.reshape(shape[0], box_length, box_length, box_length, box_length, *shape[3:])
+
+
+def get_candidates(boards: np.ndarray) -> np.ndarray:
+    # Candidate tensor of a stack of boards: empty cells minus the numbers used in their row, column and box
+    return get_unit_state(np.asarray(boards))[0]
+
+
+def get_unit_state(boards: np.ndarray) -> tuple:
+    # Candidates of a stack of boards and how often each number is placed in each row, column and box
+    side_length = boards.shape[1]
+    box_length = int(side_length ** 0.5)
+    placed = boards[..., None] == np.arange(1, side_length + 1, dtype=boards.dtype)
+    row_placed = placed.sum(axis=2, dtype=np.int8)
+    column_placed = placed.sum(axis=1, dtype=np.int8)
+    box_placed = box_view(placed, box_length).sum(axis=(2, 4), dtype=np.int8)
+    used = (row_placed > 0)[:, :, None, :] | (column_placed > 0)[:, None, :, :]
+    box_view(used, box_length)[...] |= (box_placed > 0)[:, :, None, :, None, :]
+    candidates = (boards == 0)[..., None] & ~used
+    return candidates, row_placed, column_placed, box_placed
+
+
+def propagate(boards) -> tuple:
+    """
+    Fill naked and hidden singles on a stack of boards until none of them changes.
+
+    Returns the propagated (N, n, n) boards and the status of each one:
+    SOLVED, STALLED (needs search) or UNSOLVABLE.
+    """
+    boards = np.array(boards, dtype=np.int8)
+    box_length = int(boards.shape[1] ** 0.5)
+    status = np.full(len(boards), STALLED, dtype=np.int8)
+    active = np.arange(len(boards))
+    while len(active):
+        current = boards[active]
+        candidates, row_placed, column_placed, box_placed = get_unit_state(current)
+        # Number of cells each number still fits in every row, column and box
+        row_counts = candidates.sum(axis=2, dtype=np.int8)
+        column_counts = candidates.sum(axis=1, dtype=np.int8)
+        box_counts = box_view(candidates, box_length).sum(axis=(2, 4), dtype=np.int8)
+        cell_counts = candidates.sum(axis=-1, dtype=np.int8)
+        # Dead ends: an empty cell without candidates, a number repeated or without place in a unit
+        dead = ((current == 0) & (cell_counts == 0)).any(axis=(1, 2))
+        for placed, counts in ((row_placed, row_counts), (column_placed, column_counts)):
+            dead |= ((placed > 1) | (placed + counts == 0)).any(axis=(1, 2))
+        dead |= ((box_placed > 1) | (box_placed + box_counts == 0)).any(axis=(1, 2, 3))
+        # Hidden singles: numbers that fit a single cell of a row, column or box
+        hidden = (row_counts == 1)[:, :, None, :] | (column_counts == 1)[:, None, :, :]
+        box_view(hidden, box_length)[...] |= (box_counts == 1)[:, :, None, :, None, :]
+        hidden &= candidates
+        # Naked singles (empty cells with exactly one candidate) take precedence
+        hidden[cell_counts == 1] = candidates[cell_counts == 1]
+        placements = np.where(hidden.any(axis=-1), hidden.argmax(axis=-1) + 1, 0).astype(np.int8)
+        placements[dead] = 0
+        changed = (placements > 0).any(axis=(1, 2))
+        boards[active] = current + placements
+        status[active[dead]] = UNSOLVABLE
+        finished = ~changed & ~dead & ~(current == 0).any(axis=(1, 2))
+        status[active[finished]] = SOLVED
+        active = active[changed]
+    return boards, status
+
+
+def solve_many(boards, engine="dlx") -> tuple:
+    """
+    Solve a stack of boards: propagation on all of them at once, then SudokuSolver on the stalled ones.
+
+    Returns the (N, n, n) solutions, with unsolvable boards left as far as propagation got them,
+    and a boolean array telling which boards were solved.
+    """
+    boards, status = propagate(boards)
+    for index in np.flatnonzero(status == STALLED):
+        solution = Ss.SudokuSolver(SimpleNamespace(state=boards[index].copy()), engine=engine).solve()
+        if len(solution) == 0:
+            status[index] = UNSOLVABLE
+        else:
+            boards[index] = solution
+            status[index] = SOLVED
+    return boards, status == SOLVED